@@ -7,6 +7,9 @@ from argparse import ArgumentParser
 # import os
 
 from kye.kye import Kye
+from kye.vm.engine import ENGINES
+from kye.vm.source import FORMATS
+from kye.errors.sinks import open_sink
 from kye.__about__ import __version__
 
 # def setup_readline():
@@ -50,12 +53,26 @@ def compile_script(file_path, kye: Kye):
 parser = ArgumentParser(description="Kye programming language")
 parser.add_argument("script", nargs='?',
                     help="Script to run")
-parser.add_argument('-d','--data', dest='data_file',
-                    help="Data file to load")
+parser.add_argument('-d','--data', dest='data_files', nargs='+',
+                    help="Data files to load into the model, or '-' to read from stdin")
+parser.add_argument('-f','--format', dest='format', choices=FORMATS,
+                    help="Format of the data, by default taken from the file extension")
+parser.add_argument('--chunksize', dest='chunksize', type=int,
+                    help="Number of rows to read and check at a time")
 parser.add_argument('-m','--model', dest='model_name',
                     help="Model to load")
 parser.add_argument('-c','--compiled', dest='compiled_out',
                     help="Output compiled file")
+parser.add_argument('-e','--engine', dest='engine', choices=ENGINES, default='pandas',
+                    help="Engine used to evaluate expressions")
+parser.add_argument('--memory-budget', dest='memory_budget', type=float, metavar='MB',
+                    help="Megabytes the index checks can use before spilling to disk")
+parser.add_argument('-w','--workers', dest='workers', type=int, default=1,
+                    help="Number of threads used to check columns, or 0 for one per CPU")
+parser.add_argument('-p','--processes', dest='processes', type=int, default=1,
+                    help="Number of processes to split the rows of each file between, or 0 for one per CPU")
+parser.add_argument('--errors-out', dest='errors_out', metavar='FILE',
+                    help="File to write the errors to as they are found (.jsonl, .csv or .parquet)")
 parser.add_argument('-v','--version', action='version', version=__version__)
 
 
@@ -66,21 +83,31 @@ def main():
     
     args = parser.parse_args()
     
-    kye = Kye()
-    success = kye.read(args.script)
-    if not success:
-        kye.reporter.report()
-        sys.exit(65)
-    
-    if args.compiled_out is not None:
-        kye.write_compiled(args.compiled_out)
-    
-    if args.model_name is not None:
-        assert args.data_file is not None
-        kye.load_file(args.model_name, args.data_file)
-        if kye.reporter.had_error:
+    memory_budget = int(args.memory_budget * 2**20) if args.memory_budget is not None else None
+    error_sinks = [open_sink(args.errors_out)] if args.errors_out is not None else []
+    kye = None
+    try:
+        kye = Kye(engine=args.engine, memory_budget=memory_budget, workers=args.workers or None, processes=args.processes or None, error_sinks=error_sinks)
+        success = kye.read(args.script)
+        if not success:
             kye.reporter.report()
             sys.exit(65)
+        
+        if args.compiled_out is not None:
+            kye.write_compiled(args.compiled_out)
+        
+        if args.model_name is not None:
+            assert args.data_files is not None
+            for data_file in args.data_files:
+                kye.load_file(args.model_name, data_file, args.format, args.chunksize)
+            if kye.reporter.had_error:
+                kye.reporter.report()
+                sys.exit(65)
+    finally:
+        if kye is not None:
+            kye.close()
+        for sink in error_sinks:
+            sink.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,6 +5,9 @@ from functools import cached_property, cache
 
 from kye.vm.op import OP, parse_command
 
+if t.TYPE_CHECKING:
+    from kye.vm.program import Program
+
 @dataclass(frozen=True)
 class Cmd:
     op: OP
@@ -67,6 +70,11 @@ class Assertion:
                 edges.add(cmd.args[0])
         return list(edges)
 
+    @cached_property
+    def program(self) -> Program:
+        from kye.vm.program import Program
+        return Program.compile(self.expr)
+
 @dataclass(frozen=True)
 class Edge():
     model: str
@@ -126,6 +134,13 @@ class Edge():
             else:
                 return 'one'
 
+    @cached_property
+    def program(self) -> t.Optional[Program]:
+        from kye.vm.program import Program
+        if self.expr is None:
+            return None
+        return Program.compile(self.expr)
+
 @dataclass(frozen=True)
 class Type():
     name: str
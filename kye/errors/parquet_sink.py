@@ -0,0 +1,52 @@
+"""
+Write the validation errors to a Parquet file. Rows are gathered into
+row groups of up to `BLOCK_SIZE` rows, so small errors don't each get a
+row group of their own. A Parquet file can only be read once its footer
+is written when the sink is closed.
+"""
+from __future__ import annotations
+import typing as t
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from kye.errors.sinks import FileSink
+
+SCHEMA = pa.schema([
+    ('err', pa.string()),
+    ('model', pa.string()),
+    ('row', pa.int64()),
+    ('col', pa.string()),
+    ('loc', pa.string()),
+    ('expected', pa.string()),
+])
+
+class ParquetSink(FileSink):
+    writer: pq.ParquetWriter
+    # Rows not yet written, and how many of them there are
+    buffer: t.List[pd.DataFrame]
+    num_buffered: int
+
+    def __init__(self, path: str):
+        self.writer = pq.ParquetWriter(path, SCHEMA)
+        self.buffer = []
+        self.num_buffered = 0
+
+    def write_frame(self, df: pd.DataFrame):
+        self.buffer.append(df)
+        self.num_buffered += len(df)
+        if self.num_buffered >= self.BLOCK_SIZE:
+            self.write_row_group()
+
+    def write_row_group(self):
+        if self.num_buffered == 0:
+            return
+        df = pd.concat(self.buffer, ignore_index=True)
+        self.writer.write_table(pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False))
+        self.buffer = []
+        self.num_buffered = 0
+
+    def close(self):
+        self.write_row_group()
+        self.writer.close()
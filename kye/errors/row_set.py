@@ -0,0 +1,133 @@
+"""
+The set of source rows that an error was found in. A rule can fail on
+millions of rows, so rather than a list of Python ints, the rows are kept
+in whichever of these takes the least memory:
+
+- 'array': a sorted array of the row numbers
+- 'runs': the first row and the stop of each run of consecutive rows
+- 'bitmap': a bit for each row from the first one, set for rows in the set
+
+Counting the rows or reading the first few of them doesn't unpack them,
+and the rows can be read a block at a time.
+"""
+from __future__ import annotations
+import typing as t
+
+import numpy as np
+
+# Number of bitmap bytes unpacked at a time when reading the first rows
+BLOCK_SIZE = 4096
+
+class RowSet:
+    kind: str
+    data: t.Tuple[np.ndarray, ...]
+    # The row of the first bit of a bitmap
+    start: int
+    size: int
+
+    def __init__(self, kind: str, data: t.Tuple[np.ndarray, ...], start: int, size: int):
+        self.kind = kind
+        self.data = data
+        self.start = start
+        self.size = size
+
+    @staticmethod
+    def from_rows(rows: t.Iterable[int]) -> RowSet:
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) > 1 and not (rows[1:] > rows[:-1]).all():
+            rows = np.unique(rows)
+        size = len(rows)
+        if size == 0:
+            return RowSet('array', (rows,), 0, 0)
+        is_run_start = np.empty(size, dtype=bool)
+        is_run_start[0] = True
+        np.not_equal(rows[1:], rows[:-1] + 1, out=is_run_start[1:])
+        run_starts = np.flatnonzero(is_run_start)
+        span = int(rows[-1] - rows[0]) + 1
+        # Bytes taken by each way of keeping the rows
+        array_bytes = rows.itemsize * size
+        runs_bytes = 2 * rows.itemsize * len(run_starts)
+        bitmap_bytes = (span + 7) // 8
+        if array_bytes <= min(runs_bytes, bitmap_bytes):
+            return RowSet('array', (rows,), 0, size)
+        if runs_bytes <= bitmap_bytes:
+            stops = np.append(rows[run_starts[1:] - 1], rows[-1]) + 1
+            return RowSet('runs', (rows[run_starts], stops), 0, size)
+        bits = np.zeros(span, dtype=bool)
+        bits[rows - rows[0]] = True
+        return RowSet('bitmap', (np.packbits(bits),), int(rows[0]), size)
+
+    @staticmethod
+    def union(row_sets: t.Iterable[RowSet]) -> RowSet:
+        row_sets = [rows for rows in row_sets if len(rows) > 0]
+        if len(row_sets) == 0:
+            return EMPTY
+        if len(row_sets) == 1:
+            return row_sets[0]
+        return RowSet.from_rows(np.concatenate([rows.to_numpy() for rows in row_sets]))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f'RowSet({self.kind}, {self.size} rows)'
+
+    def to_numpy(self) -> np.ndarray:
+        """ The sorted row numbers """
+        if self.kind == 'runs':
+            return expand_runs(*self.data)
+        if self.kind == 'bitmap':
+            return np.flatnonzero(np.unpackbits(self.data[0])) + self.start
+        return self.data[0]
+
+    def head(self, n: int) -> np.ndarray:
+        """ The first `n` row numbers, unpacking only as much as is needed """
+        if self.kind == 'runs':
+            starts, stops = self.data
+            lengths = stops - starts
+            num_runs = int(np.searchsorted(np.cumsum(lengths), n)) + 1
+            first_runs = RowSet('runs', (starts[:num_runs], stops[:num_runs]), 0, int(lengths[:num_runs].sum()))
+            return first_runs.to_numpy()[:n]
+        if self.kind == 'bitmap':
+            found = []
+            count = 0
+            for rows in self.blocks(8 * BLOCK_SIZE):
+                found.append(rows)
+                count += len(rows)
+                if count >= n:
+                    break
+            return np.concatenate(found)[:n] if found else np.empty(0, dtype=np.int64)
+        return self.data[0][:n]
+
+    def blocks(self, size: int) -> t.Iterator[np.ndarray]:
+        """ The sorted row numbers, at most `size` at a time """
+        if self.kind == 'runs':
+            starts, stops = self.data
+            ends = np.cumsum(stops - starts)
+            for first_position in range(0, self.size, size):
+                stop_position = min(first_position + size, self.size)
+                first, last = np.searchsorted(ends, [first_position, stop_position - 1], side='right')
+                block_starts = starts[first:last + 1].copy()
+                block_stops = stops[first:last + 1].copy()
+                # Cut the first and last runs down to the rows in the block
+                block_starts[0] += first_position - (ends[first] - (stops[first] - starts[first]))
+                block_stops[-1] -= ends[last] - stop_position
+                yield expand_runs(block_starts, block_stops)
+        elif self.kind == 'bitmap':
+            bits = self.data[0]
+            num_bytes = max(size // 8, 1)
+            for offset in range(0, len(bits), num_bytes):
+                rows = np.flatnonzero(np.unpackbits(bits[offset:offset + num_bytes])) + self.start + 8 * offset
+                for i in range(0, len(rows), size):
+                    yield rows[i:i + size]
+        else:
+            for offset in range(0, self.size, size):
+                yield self.data[0][offset:offset + size]
+
+def expand_runs(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """ The rows of each run from `starts` up to `stops` """
+    lengths = stops - starts
+    first_positions = np.cumsum(lengths) - lengths
+    return np.arange(int(lengths.sum()), dtype=np.int64) + np.repeat(starts - first_positions, lengths)
+
+EMPTY = RowSet('array', (np.empty(0, dtype=np.int64),), 0, 0)
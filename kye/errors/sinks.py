@@ -0,0 +1,95 @@
+"""
+Sinks that the validation errors are written to as they are found, so
+that a run with many errors keeps what it found even if it doesn't finish.
+
+Each error is written as rows of the same table as `error_df`: one for
+each of its rows and edges. An error's rows are written a block at a
+time, so an error on millions of rows is never all in memory as a table.
+"""
+from __future__ import annotations
+import typing as t
+import io
+
+import pandas as pd
+
+if t.TYPE_CHECKING:
+    from kye.errors.validation_errors import Error
+
+SINK_FORMATS = ('jsonl', 'csv', 'parquet')
+
+class ErrorSink:
+    """ Somewhere that errors are written to when they are found """
+
+    def write(self, error: Error):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class FileSink(ErrorSink):
+    """ A sink that writes the rows of each error to a file """
+    # Number of an error's rows that are turned into a table at a time
+    BLOCK_SIZE = 100_000
+
+    def write(self, error: Error):
+        if len(error.rows) == 0:
+            self.write_frame(error.to_frame())
+        for rows in error.rows.blocks(self.BLOCK_SIZE):
+            self.write_frame(error.to_frame(rows))
+        self.flush()
+
+    def write_frame(self, df: pd.DataFrame):
+        raise NotImplementedError()
+
+    def flush(self):
+        """ Called after each error, so that it is on disk before the next one is found """
+        pass
+
+class TextSink(FileSink):
+    file: io.TextIOBase
+
+    def __init__(self, path: str):
+        self.file = open(path, 'w', newline='')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class JsonlSink(TextSink):
+    def write_frame(self, df: pd.DataFrame):
+        df.to_json(self.file, orient='records', lines=True)
+
+class CsvSink(TextSink):
+    has_header: bool
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.has_header = False
+
+    def write_frame(self, df: pd.DataFrame):
+        df.to_csv(self.file, header=not self.has_header, index=False)
+        self.has_header = True
+
+def open_sink(path: str, format: t.Optional[str] = None) -> ErrorSink:
+    """ Open a file to write errors to, in the format of its extension if not given """
+    if format is None:
+        format = path.split('.')[-1]
+    if format not in SINK_FORMATS:
+        raise ValueError(f"Unknown error file type '{format}', expected one of: {', '.join(SINK_FORMATS)}")
+    if format == 'parquet':
+        try:
+            from kye.errors.parquet_sink import ParquetSink
+        except ImportError as e:
+            raise ImportError("Writing errors to parquet requires pyarrow to be installed") from e
+        return ParquetSink(path)
+    if format == 'csv':
+        return CsvSink(path)
+    return JsonlSink(path)
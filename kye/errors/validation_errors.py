@@ -1,22 +1,33 @@
 from __future__ import annotations
 import typing as t
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, replace
 
 import pandas as pd
+import numpy as np
 
 from kye.errors.base_reporter import ErrorReporter
+from kye.errors.row_set import RowSet, EMPTY
+from kye.errors.sinks import ErrorSink
 
 if t.TYPE_CHECKING:
     import kye.compiled as c
 
+# Columns of the table of errors, with a row for each row and edge of an error
+COLUMNS = ['err', 'model', 'row', 'col', 'loc', 'expected']
+# Stands in for the row of an error that is not about specific rows
+NO_ROW = np.zeros(1, dtype=np.int64)
+
 @dataclass
 class Error:
     err: str
     model: str
-    rows: t.List[int]
+    rows: RowSet
     edges: t.List[str]
     loc: t.Optional[str]
     expected: t.Optional[str] = None
+    # Number of rows the error was found in, when `rows` only keeps the
+    # ones that are shown because the rest were written to the sinks
+    num_rows: t.Optional[int] = None
     
     def message(self):
         if self.err == 'InvalidType':
@@ -35,117 +46,206 @@ class Error:
             return f"{self.model} has index conflict: {','.join(self.edges)}"
         raise ValueError(f"Invalid error type: {self.err}")
 
+    def to_frame(self, rows: t.Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        A row for each of the given rows of the error, or all of its rows,
+        and each of its edges. An error that is not about specific rows
+        has a single row with a null row number.
+        """
+        if rows is None:
+            rows = self.rows.to_numpy()
+        is_null = len(rows) == 0
+        if is_null:
+            rows = NO_ROW
+        edges = np.array(self.edges if len(self.edges) else [None], dtype=object)
+        return pd.DataFrame({
+            'err': self.err,
+            'model': self.model,
+            'row': pd.arrays.IntegerArray(np.repeat(rows, len(edges)), np.full(len(rows) * len(edges), is_null)),
+            'col': np.tile(edges, len(rows)),
+            'loc': self.loc,
+            'expected': self.expected,
+        }, columns=COLUMNS)
+
 class ValidationErrorReporter(ErrorReporter):
     errors: t.List[Error]
-    df: pd.DataFrame
+    # Model of the sources whose rows are shown with the errors, and a
+    # function for each of them that reads the given rows
+    source_model: t.Optional[str]
+    sources: t.List[t.Callable[[t.Iterable[int]], pd.DataFrame]]
+    # The rows read from the sources, once they are shown
+    source_df: t.Optional[pd.DataFrame]
+    # Where the errors are written as they are found
+    sinks: t.List[ErrorSink]
+    # Number of source rows shown with the errors
+    ROW_COUNT = 10
 
-    def __init__(self, ):
+    def __init__(self, sinks: t.Sequence[ErrorSink] = ()):
         self.errors = []
+        self.sinks = list(sinks)
+        self.source_model = None
+        self.sources = []
+        self.source_df = None
     
-    def use_source(self, df):
-        self.df = df
+    def use_source(self, model_name: str, read_rows: t.Callable[[t.Iterable[int]], pd.DataFrame]):
+        # Keep the model's earlier sources, whose errors are still shown
+        if self.source_model != model_name:
+            self.source_model = model_name
+            self.sources = []
+        self.sources.append(read_rows)
+        self.source_df = None
+
+    @property
+    def df(self) -> t.Optional[pd.DataFrame]:
+        """ The source rows shown with the errors, which are read when first needed """
+        if self.source_df is None and self.source_model is not None:
+            rows = self.display_rows(self.source_model)
+            self.source_df = pd.concat([read_rows(rows) for read_rows in self.sources])
+        return self.source_df
     
     @property
     def had_error(self):
         return len(self.errors) > 0
 
+    def add(self, error: Error) -> Error:
+        for sink in self.sinks:
+            sink.write(error)
+        self.errors.append(error)
+        self.keep_shown_rows(error)
+        return error
+
+    def add_rows(self, error: Error, rows: t.Iterable[int]):
+        """ Add rows that an error was found in after it was added, such as those of a later chunk """
+        found = replace(error, rows=RowSet.from_rows(rows), num_rows=None)
+        for sink in self.sinks:
+            sink.write(found)
+        num_rows = (error.num_rows if error.num_rows is not None else len(error.rows)) + len(found.rows)
+        error.rows = RowSet.union([error.rows, found.rows])
+        error.num_rows = num_rows if num_rows > len(error.rows) else None
+        self.keep_shown_rows(error)
+
+    def keep_shown_rows(self, error: Error):
+        """ Once an error's rows are written to the sinks, only keep the ones that can be shown """
+        if len(self.sinks) == 0 or len(error.rows) <= self.ROW_COUNT:
+            return
+        if error.num_rows is None:
+            error.num_rows = len(error.rows)
+        error.rows = RowSet.from_rows(error.rows.head(self.ROW_COUNT))
+
     def wrong_type(self, edge: c.Edge):
-        self.errors.append(Error(
+        self.add(Error(
             err='InvalidType',
             model=edge.model,
-            rows=[],
+            rows=EMPTY,
             edges=[edge.name],
             loc=edge.loc,
             expected=edge.type,
         ))
     
-    def multiple_values(self, edge: c.Edge, rows: t.List[int]):
-        self.errors.append(Error(
+    def multiple_values(self, edge: c.Edge, rows: t.Iterable[int]):
+        self.add(Error(
             err='MultipleValues',
             model=edge.model,
-            rows=rows,
+            rows=RowSet.from_rows(rows),
             edges=[edge.name],
             loc=edge.loc,
         ))
     
-    def missing_values(self, edge: c.Edge, rows: t.List[int]):
-        self.errors.append(Error(
+    def missing_values(self, edge: c.Edge, rows: t.Iterable[int]):
+        self.add(Error(
             err='MissingValue',
             model=edge.model,
-            rows=rows,
+            rows=RowSet.from_rows(rows),
             edges=[edge.name],
             loc=edge.loc,
         ))
     
-    def assertion_failed(self, assertion: c.Assertion, rows: t.List[int]):
-        self.errors.append(Error(
+    def assertion_failed(self, assertion: c.Assertion, rows: t.Iterable[int]) -> Error:
+        return self.add(Error(
             err='AssertionFailed',
             model=assertion.model,
-            rows=rows,
+            rows=RowSet.from_rows(rows),
             edges=assertion.edges,
             loc=assertion.loc,
             expected=assertion.msg,
         ))
     
     def missing_index(self, edge: c.Edge):
-        self.errors.append(Error(
+        self.add(Error(
             err='MissingIndex',
             model=edge.model,
-            rows=[],
+            rows=EMPTY,
             edges=[edge.name],
             loc=edge.loc,
         ))
     
-    def non_unique_sub_index(self, model: c.Model, sub_idx_edges: t.List[str], rows: t.List[int]):
-        self.errors.append(Error(
+    def non_unique_sub_index(self, model: c.Model, sub_idx_edges: t.List[str], rows: t.Iterable[int]):
+        self.add(Error(
             err='NonUniqueSubIndex',
             model=model.name,
-            rows=rows,
+            rows=RowSet.from_rows(rows),
             edges=sub_idx_edges,
             loc=model.loc,
         ))
     
-    def index_conflict(self, model: c.Model, sub_idx_edges: t.List[str], rows: t.List[int]):
-        self.errors.append(Error(
+    def index_conflict(self, model: c.Model, sub_idx_edges: t.List[str], rows: t.Iterable[int]):
+        self.add(Error(
             err='IndexConflict',
             model=model.name,
-            rows=rows,
+            rows=RowSet.from_rows(rows),
             edges=sub_idx_edges,
             loc=model.loc,
         ))
     
+    def display_rows(self, model_name: str) -> t.List[int]:
+        """ The rows with errors that will be shown from the model's source """
+        # The first rows of the union are among the first rows of each set
+        rows = RowSet.union(
+            RowSet.from_rows(err.rows.head(self.ROW_COUNT))
+            for err in self.errors if err.model == model_name
+        )
+        return rows.head(self.ROW_COUNT).tolist()
+
     @property
     def error_df(self):
+        """
+        A row for each row and edge of each error. Errors that were written
+        to the sinks only have the rows that are shown
+        """
         if not self.had_error:
-            return pd.DataFrame(columns=['err','model','row','col','loc','expected'])
-        return pd.DataFrame(map(asdict, self.errors)).explode('rows').explode('edges').rename(columns={
-            'rows': 'row',
-            'edges': 'col',
-        })
+            return pd.DataFrame(columns=COLUMNS)
+        frames = [err.to_frame() for err in self.errors]
+        df = pd.concat(frames)
+        df.index = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+        return df
     
+    def highlighted_rows(self) -> t.List[int]:
+        """ The source rows that are printed with the errors """
+        rows = self.display_rows(self.df.index.name)
+        if any(len(err.rows) == 0 for err in self.errors):
+            # Errors that are not about specific rows are shown with the first rows
+            rows += self.df.head(self.ROW_COUNT).index.tolist()
+        return rows[:self.ROW_COUNT]
+
     def print_highlighted_df(self):
-        ROW_COUNT = 10
         if not self.had_error:
             return
-        all_rows = False
-        rows = set()
         cols = set()
         for err in self.errors:
             assert err.model == self.df.index.name
-            if len(err.rows) == 0:
-                all_rows = True
-            rows.update(err.rows)
             cols.update(err.edges)
-        rows = sorted(list(rows))
-        num_errors = len(rows)
-        if all_rows:
-            rows += self.df.head(ROW_COUNT).index.tolist()
-        rows = rows[:ROW_COUNT]
+        num_errors = len(RowSet.union(err.rows for err in self.errors))
+        # The rows that were written to the sinks are only counted, so
+        # how many rows they share with other errors isn't known
+        num_written = [err.num_rows for err in self.errors if err.num_rows is not None]
+        is_exact = len(num_written) == 0 or len(self.errors) == 1
+        num_errors = max(num_written + [num_errors])
+        rows = self.highlighted_rows()
         # make column order match original order of columns
         cols = [col for col in self.df.columns if col in cols]
         print(self.df.loc[rows, cols].reset_index().to_string(index=False))
         if num_errors > len(rows):
-            print(f'... and {num_errors - len(rows)} more rows')
+            print(f"... and {'' if is_exact else 'at least '}{num_errors - len(rows)} more rows")
     
     def report(self):
         for err in self.errors:
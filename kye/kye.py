@@ -1,3 +1,4 @@
+from __future__ import annotations
 import typing as t
 from dataclasses import dataclass
 from pathlib import Path
@@ -9,12 +10,16 @@ from kye.parse.parser import Parser
 from kye.parse.desugar import Desugar
 from kye.type.type_builder import TypeBuilder
 from kye.vm.loader import Loader
+from kye.vm.source import FrameSource, open_source
 from kye.errors.base_reporter import ErrorReporter
 from kye.errors.compilation_errors import CompilationErrorReporter
 from kye.errors.validation_errors import ValidationErrorReporter
+from kye.errors.sinks import ErrorSink
 from kye.type.compiler import compile
 from kye.compiled import Compiled
 from kye.vm.vm import VM
+from kye.vm.engine import Engine, get_engine
+from kye.vm.scheduler import Scheduler, ProcessPool
 
 class Kye:
     reporter: ErrorReporter
@@ -22,11 +27,45 @@ class Kye:
     vm: VM
     loader: t.Optional[Loader]
     compiled: t.Optional[Compiled]
+    engine: Engine
+    memory_budget: t.Optional[int]
+    scheduler: Scheduler
+    processes: t.Optional[int]
+    pool: ProcessPool
+    error_sinks: t.List[ErrorSink]
 
-    def __init__(self):
+    def __init__(self, engine: str = 'pandas', memory_budget: t.Optional[int] = None, workers: t.Optional[int] = 1, processes: t.Optional[int] = 1, error_sinks: t.Sequence[ErrorSink] = ()):
+        """
+        `memory_budget` is the number of bytes that the index checks of a
+        table can use before they spill to temporary files. `workers` is
+        the number of threads that check columns at the same time, or
+        None for one per CPU. `processes` is the number of processes that
+        the rows of each file are split between, or None for one per CPU.
+        Validation errors are written to each of the `error_sinks` as they
+        are found, which are left open for the caller to close.
+        The threads and processes are kept for every load until `close` is called,
+        or the `with` block that the instance was used in ends.
+        """
+        self.engine = get_engine(engine)
+        self.memory_budget = memory_budget
+        self.scheduler = Scheduler(workers)
+        self.processes = processes
+        self.pool = ProcessPool(processes)
+        self.error_sinks = list(error_sinks)
         self.type_builder = TypeBuilder()
         self.loader = None
         self.compiled = None
+
+    def __enter__(self) -> Kye:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Stop the threads and processes that the loads were run on """
+        self.scheduler.close()
+        self.pool.close()
     
     def parse_definitions(self, source: str) -> t.Optional[ast.Script]:
         """ Parse definitions from source code """
@@ -77,8 +116,9 @@ class Kye:
 
     def load_compiled(self, compiled: Compiled) -> bool:
         self.compiled = compiled
-        self.reporter = ValidationErrorReporter()
-        self.loader = Loader(self.compiled, self.reporter)
+        self.reporter = ValidationErrorReporter(self.error_sinks)
+        self.pool.resize(self.processes)
+        self.loader = Loader(self.compiled, self.reporter, self.engine, self.memory_budget, self.scheduler, self.pool)
         return not self.reporter.had_error
 
     def read_compiled(self, filepath: str) -> bool:
@@ -112,22 +152,17 @@ class Kye:
             raise ValueError(f'Unsupported file extension: {path.suffix}')
         path.write_text(text)
     
-    def load_file(self, source_name: str, filepath: str):
+    def load_file(self, source_name: str, filepath: str, format: t.Optional[str] = None, chunksize: t.Optional[int] = None):
+        """
+        Load a file, or stdin if the path is '-'. When a chunk size is given
+        the file is read and checked that many rows at a time.
+        """
         assert self.loader is not None
-        file = Path(filepath)
-        if file.suffix == '.csv':
-            table = pd.read_csv(file)
-        elif file.suffix == '.json':
-            table = pd.read_json(file)
-        elif file.suffix == '.jsonl':
-            table = pd.read_json(file, lines=True)
-        else:
-            raise ValueError(f"Unknown file type {file.suffix}")
-        self.load_df(source_name, table)
+        self.loader.load_source(source_name, open_source(filepath, format, chunksize))
 
-    def load_df(self, source_name: str, table: pd.DataFrame):
+    def load_df(self, source_name: str, table: pd.DataFrame, chunksize: t.Optional[int] = None):
         assert self.loader is not None
-        self.loader.load(source_name, table)
+        self.loader.load_source(source_name, FrameSource(table, chunksize))
     
     # def validate_model(self, source_name: str):
     #     assert self.vm is not None
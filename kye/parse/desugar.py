@@ -40,7 +40,17 @@ def create_assertion(expr: ast.Expr, edge: str) -> t.Tuple[ast.Expr, str]:
         `"a"` => `edge == "a"`
         `!a` => `edge != a`
         `a & b` => `edge == a & edge == b`
+        `a | b | c` => `in(edge, a, b, c)`
     """
+    options = literal_options(expr)
+    if options is not None and len(options) > 1:
+        types = {option.type for option in options}
+        assert len(types) == 1
+        return ast.Call(
+            object=edge_identifier('in'),
+            paren=token(ast.TokenType.LPAREN),
+            arguments=(edge_identifier(edge),) + tuple(options),
+        ), types.pop()
     if isinstance(expr, ast.Regex):
         return ast.Call(
             object=edge_identifier('matches'),
@@ -57,6 +67,9 @@ def create_assertion(expr: ast.Expr, edge: str) -> t.Tuple[ast.Expr, str]:
         return expr, left_type
     if isinstance(expr, ast.Unary) and expr.operator.type == ast.TokenType.NOT:
         right, right_type = create_assertion(expr.right, edge)
+        if not isinstance(expr.right, ast.Literal):
+            expr.right = right
+            return expr, right_type
         return ast.Binary(
             left=edge_identifier(edge),
             operator=token(ast.TokenType.NE),
@@ -70,6 +83,17 @@ def create_assertion(expr: ast.Expr, edge: str) -> t.Tuple[ast.Expr, str]:
         ), expr.type
     raise Exception(f'Unable to resolve assertion for {expr}')
 
+def literal_options(expr: ast.Expr) -> t.Optional[t.List[ast.Literal]]:
+    """ The literals of a union like `"a" | "b" | "c"`, or None if it has anything else """
+    if isinstance(expr, ast.Literal):
+        return [expr]
+    if isinstance(expr, ast.Binary) and expr.operator.type == ast.TokenType.OR:
+        left = literal_options(expr.left)
+        right = literal_options(expr.right)
+        if left is not None and right is not None:
+            return left + right
+    return None
+
 class Desugar(ast.Visitor):
     refs: t.Set[str]
     aliases: t.Dict[str, ast.Expr]
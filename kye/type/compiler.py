@@ -3,6 +3,7 @@ import typing as t
 
 import kye.type.types as typ
 from kye.vm.op import OP
+from kye.type.optimizer import optimize, is_always_true
 from kye.compiled import Compiled, Model, Edge, Assertion, Cmd
 
 def compile(types: typ.Types) -> Compiled:
@@ -29,8 +30,10 @@ def compile_model(type: typ.Model) -> Model:
             for edge in type.edges.values()
         },
         assertions=[
-            compile_assertion(type.name, assertion)
+            compile_assertion(type.name, assertion, expr)
             for assertion in type.assertions
+            for expr in [optimize(assertion.expr)]
+            if not is_always_true(expr)
         ],
         loc=str(type.loc) if type.loc else None
     )
@@ -48,17 +51,17 @@ def compile_edge(model_name: str, edge: typ.Edge) -> Edge:
         name=edge.name,
         title=edge.title,
         type=type_name,
-        expr=list(compile_expr(edge.expr)) if edge.expr else None,
+        expr=list(compile_expr(optimize(edge.expr))) if edge.expr else None,
         many=edge.allows_many,
         none=edge.allows_none,
         loc=str(edge.loc) if edge.loc else None
     )
 
-def compile_assertion(model_name: str, assertion: typ.Assertion) -> Assertion:
+def compile_assertion(model_name: str, assertion: typ.Assertion, expr: typ.Cmd) -> Assertion:
     return Assertion(
         model=model_name,
         msg='',
-        expr=list(compile_expr(assertion.expr)),
+        expr=list(compile_expr(expr)),
         loc=str(assertion.loc) if assertion.loc else None
     )
 
@@ -0,0 +1,287 @@
+"""
+Rewrites expression trees before they are compiled, so that the compiled
+model (and anything loaded from it later) evaluates the simpler form.
+
+Boolean operators follow the VM's null semantics: a row that is null on
+only one side of an AND/OR evaluates to False. Rewrites that would change
+which rows are null are only applied when both sides are null on the same
+rows.
+"""
+from __future__ import annotations
+import typing as t
+import re
+import operator
+
+import kye.type.types as typ
+from kye.vm.op import OP
+
+COMPARISONS = (OP.EQ, OP.NE, OP.LT, OP.GT, OP.LE, OP.GE)
+BOOLEAN_OPS = COMPARISONS + (OP.AND, OP.OR, OP.NOT, OP.NA, OP.DEF, OP.MATCHES, OP.BETWEEN, OP.IN, OP.NOT_IN)
+
+# `a < b` is the same as `b > a`
+FLIPPED = {
+    OP.EQ: OP.EQ, OP.NE: OP.NE,
+    OP.LT: OP.GT, OP.GT: OP.LT,
+    OP.LE: OP.GE, OP.GE: OP.LE,
+}
+
+# Whether the (lower, upper) bounds of a between-check are inclusive
+INCLUSIVE = {
+    (True, True): 'both',
+    (True, False): 'left',
+    (False, True): 'right',
+    (False, False): 'neither',
+}
+
+# `!(a < b)` is the same as `a >= b`
+NEGATED = {
+    OP.EQ: OP.NE, OP.NE: OP.EQ,
+    OP.LT: OP.GE, OP.GE: OP.LT,
+    OP.GT: OP.LE, OP.LE: OP.GT,
+    OP.IN: OP.NOT_IN, OP.NOT_IN: OP.IN,
+}
+
+FOLDABLE: t.Dict[OP, t.Callable] = {
+    OP.NEG: operator.neg,
+    OP.EQ: operator.eq,
+    OP.NE: operator.ne,
+    OP.LT: operator.lt,
+    OP.GT: operator.gt,
+    OP.LE: operator.le,
+    OP.GE: operator.ge,
+    OP.AND: operator.and_,
+    OP.OR: operator.or_,
+    OP.ADD: operator.add,
+    OP.SUB: operator.sub,
+    OP.MUL: operator.mul,
+    OP.DIV: operator.truediv,
+    OP.MOD: operator.mod,
+    OP.CONCAT: operator.add,
+}
+
+def optimize(cmd: typ.Cmd) -> typ.Cmd:
+    """ Rewrite an expression into a simpler one that evaluates to the same values """
+    cmd = typ.Cmd(cmd.op, (
+        optimize(arg) if isinstance(arg, typ.Cmd) else arg
+        for arg in cmd.args
+    ))
+    for rule in RULES:
+        rewritten = rule(cmd)
+        if rewritten is not None:
+            return optimize(rewritten)
+    return cmd
+
+def is_always_true(cmd: typ.Cmd) -> bool:
+    """ Whether an assertion can never fail, so it does not need to be checked """
+    if is_literal(cmd):
+        return cmd.args[0] is True
+    # `x | true` is true wherever x is defined, and null rows are never reported
+    if cmd.op == OP.OR:
+        left, right = cmd.args
+        return any(
+            is_literal(side) and side.args[0] is True and is_boolean(other)
+            for side, other in ((left, right), (right, left))
+        )
+    return False
+
+def is_literal(cmd: t.Any) -> bool:
+    return isinstance(cmd, typ.Cmd) and cmd.op == OP.VAL
+
+def is_boolean(cmd: t.Any) -> bool:
+    return isinstance(cmd, typ.Cmd) and (
+        cmd.op in BOOLEAN_OPS or (is_literal(cmd) and isinstance(cmd.args[0], bool))
+    )
+
+def cmd_key(cmd: t.Any) -> t.Hashable:
+    """ A key that is equal for structurally identical expressions """
+    if isinstance(cmd, typ.Cmd):
+        return (cmd.op, tuple(cmd_key(arg) for arg in cmd.args))
+    return (type(cmd).__name__, cmd)
+
+def null_columns(cmd: t.Any) -> t.Optional[t.FrozenSet[str]]:
+    """
+    The columns whose nulls decide where `cmd` is null,
+    or None if its operations could introduce other nulls
+    """
+    if not isinstance(cmd, typ.Cmd) or not cmd.op.preserves_nulls:
+        return None
+    if cmd.op == OP.COL:
+        return frozenset(cmd.args)
+    columns: t.FrozenSet[str] = frozenset()
+    for arg in cmd.args:
+        if isinstance(arg, typ.Cmd):
+            arg_columns = null_columns(arg)
+            if arg_columns is None:
+                return None
+            columns |= arg_columns
+    return columns
+
+def same_nulls(left: typ.Cmd, right: typ.Cmd) -> bool:
+    left_columns = null_columns(left)
+    return left_columns is not None and left_columns == null_columns(right)
+
+def fold_constants(cmd: typ.Cmd) -> t.Optional[typ.Cmd]:
+    operands = [arg for arg in cmd.args if isinstance(arg, typ.Cmd)]
+    if len(operands) == 0 or not all(is_literal(arg) for arg in operands):
+        return None
+    values = [arg.args[0] for arg in operands]
+    try:
+        if cmd.op == OP.NOT:
+            value = not values[0] if isinstance(values[0], bool) else ~values[0]
+        elif cmd.op == OP.LEN and isinstance(values[0], str):
+            value = len(values[0])
+        elif cmd.op == OP.MATCHES and all(isinstance(v, str) for v in values):
+            value = re.search(values[1], values[0]) is not None
+        elif cmd.op in (OP.IN, OP.NOT_IN):
+            value = (values[0] in cmd.args[1]) == (cmd.op == OP.IN)
+        elif cmd.op in FOLDABLE:
+            value = FOLDABLE[cmd.op](*values)
+        else:
+            return None
+    except (TypeError, ArithmeticError, re.error):
+        # Leave it to fail the same way it would have at runtime
+        return None
+    return typ.Cmd(OP.VAL, [value])
+
+def remove_double_negation(cmd: typ.Cmd) -> t.Optional[typ.Cmd]:
+    if cmd.op in (OP.NOT, OP.NEG):
+        inner = cmd.args[0]
+        if isinstance(inner, typ.Cmd) and inner.op == cmd.op:
+            return inner.args[0]
+    return None
+
+def push_down_negation(cmd: typ.Cmd) -> t.Optional[typ.Cmd]:
+    if cmd.op != OP.NOT:
+        return None
+    inner = cmd.args[0]
+    if not isinstance(inner, typ.Cmd):
+        return None
+    if inner.op in NEGATED:
+        return typ.Cmd(NEGATED[inner.op], inner.args)
+    # De Morgan, only when both sides are null on the same rows
+    if inner.op in (OP.AND, OP.OR) and same_nulls(*inner.args):
+        left, right = inner.args
+        return typ.Cmd(
+            OP.OR if inner.op == OP.AND else OP.AND,
+            (typ.Cmd(OP.NOT, [left]), typ.Cmd(OP.NOT, [right]))
+        )
+    return None
+
+def literal_to_right(cmd: typ.Cmd) -> t.Optional[typ.Cmd]:
+    if cmd.op in FLIPPED:
+        left, right = cmd.args
+        if is_literal(left) and not is_literal(right):
+            return typ.Cmd(FLIPPED[cmd.op], (right, left))
+    return None
+
+def remove_dead_branch(cmd: typ.Cmd) -> t.Optional[typ.Cmd]:
+    # `x & true` and `x | false` are just `x` when x is a boolean
+    identity = {OP.AND: True, OP.OR: False}.get(cmd.op)
+    if identity is None:
+        return None
+    left, right = cmd.args
+    for side, other in ((left, right), (right, left)):
+        if is_literal(side) and side.args[0] is identity and is_boolean(other):
+            return other
+    return None
+
+def bound(cmd: typ.Cmd) -> t.Optional[t.Tuple[typ.Cmd, str, t.Any, bool]]:
+    """ Read `x > 0` as (x, 'lower', 0, inclusive) """
+    if cmd.op not in (OP.LT, OP.GT, OP.LE, OP.GE):
+        return None
+    subject, limit = cmd.args
+    if not is_literal(limit) or is_literal(subject) or isinstance(limit.args[0], bool):
+        return None
+    side = 'lower' if cmd.op in (OP.GT, OP.GE) else 'upper'
+    return subject, side, limit.args[0], cmd.op in (OP.GE, OP.LE)
+
+def conjuncts(cmd: typ.Cmd) -> t.List[typ.Cmd]:
+    if isinstance(cmd, typ.Cmd) and cmd.op == OP.AND:
+        return [part for arg in cmd.args for part in conjuncts(arg)]
+    return [cmd]
+
+def fuse_ranges(cmd: typ.Cmd) -> t.Optional[typ.Cmd]:
+    """
+    Turn `x > 0 & x <= 120` into a single between-check. AND chains are
+    reordered to find the pairs, which is safe because the VM's AND gives
+    the same result in any order: null if every side is null, otherwise
+    False if any side is null.
+    """
+    if cmd.op != OP.AND:
+        return None
+    parts = conjuncts(cmd)
+    bounds = [bound(part) for part in parts]
+    for i, lower in enumerate(bounds):
+        if lower is None or lower[1] != 'lower':
+            continue
+        for j, upper in enumerate(bounds):
+            if upper is None or upper[1] != 'upper':
+                continue
+            if cmd_key(lower[0]) != cmd_key(upper[0]):
+                continue
+            if isinstance(lower[2], str) != isinstance(upper[2], str):
+                continue
+            inclusive = INCLUSIVE[lower[3], upper[3]]
+            parts[min(i, j)] = typ.Cmd(OP.BETWEEN, (
+                lower[0],
+                typ.Cmd(OP.VAL, [lower[2]]),
+                typ.Cmd(OP.VAL, [upper[2]]),
+                inclusive,
+            ))
+            del parts[max(i, j)]
+            result = parts[0]
+            for part in parts[1:]:
+                result = typ.Cmd(OP.AND, (result, part))
+            return result
+    return None
+
+def membership(cmd: typ.Cmd, op: OP) -> t.Optional[t.Tuple[typ.Cmd, t.List[t.Any]]]:
+    """ Read `x == 1` or `x in [1, 2]` as (x, [1, 2]), or the NE/NOT_IN forms if `op` is NOT_IN """
+    if not isinstance(cmd, typ.Cmd):
+        return None
+    subject = cmd.args[0]
+    if cmd.op == op:
+        return subject, list(cmd.args[1])
+    if cmd.op == (OP.EQ if op == OP.IN else OP.NE) and is_literal(cmd.args[1]) and not is_literal(subject):
+        return subject, [cmd.args[1].args[0]]
+    return None
+
+def merge_membership(cmd: typ.Cmd) -> t.Optional[typ.Cmd]:
+    """
+    Turn `x == "a" | x == "b"` into `x in ["a", "b"]`,
+    and `x != "a" & x != "b"` into `x not in ["a", "b"]`
+    """
+    op = {OP.OR: OP.IN, OP.AND: OP.NOT_IN}.get(cmd.op)
+    if op is None:
+        return None
+    if op == OP.NOT_IN:
+        # `x in ["a", "b"] & x != "b"` is just `x in ["a"]`
+        for allowed, excluded in (cmd.args, cmd.args[::-1]):
+            allowed, excluded = membership(allowed, OP.IN), membership(excluded, OP.NOT_IN)
+            if allowed is not None and excluded is not None and cmd_key(allowed[0]) == cmd_key(excluded[0]):
+                excluded_keys = {cmd_key(value) for value in excluded[1]}
+                return typ.Cmd(OP.IN, (allowed[0], [
+                    value for value in allowed[1]
+                    if cmd_key(value) not in excluded_keys
+                ]))
+    left, right = (membership(arg, op) for arg in cmd.args)
+    if left is None or right is None or cmd_key(left[0]) != cmd_key(right[0]):
+        return None
+    values = []
+    seen = set()
+    for value in left[1] + right[1]:
+        # Keep `1` and `True` apart
+        if cmd_key(value) not in seen:
+            seen.add(cmd_key(value))
+            values.append(value)
+    return typ.Cmd(op, (left[0], values))
+
+RULES: t.List[t.Callable[[typ.Cmd], t.Optional[typ.Cmd]]] = [
+    fold_constants,
+    remove_double_negation,
+    push_down_negation,
+    literal_to_right,
+    remove_dead_branch,
+    fuse_ranges,
+    merge_membership,
+]
@@ -183,4 +183,11 @@ class TypeBuilder(ast.Visitor):
             assert len(arguments) == 2
             return typ.Cmd(OP.MATCHES, args)
         
+        if edge == 'in':
+            assert len(arguments) >= 2
+            options = args[1:]
+            if not all(isinstance(opt, typ.Cmd) and opt.op == OP.VAL for opt in options):
+                raise NotImplementedError('in() only supports literal options')
+            return typ.Cmd(OP.IN, (args[0], [opt.args[0] for opt in options]))
+        
         raise NotImplementedError('Call operations not yet implemented')
\ No newline at end of file
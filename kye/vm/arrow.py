@@ -0,0 +1,183 @@
+"""
+An engine that runs column loads, comparisons, string functions and
+aggregates with `pyarrow.compute`. Arrow handles nulls natively, so
+values never need to be compressed to the valid rows first, and string
+kernels run over Arrow's contiguous buffers instead of Python objects.
+
+Any operation that Arrow does not support for the given types, like
+comparing strings to numbers, falls back to the pandas kernel.
+"""
+from __future__ import annotations
+import typing as t
+import weakref
+from functools import partial
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from kye.vm.op import OP
+from kye.vm.column import Column
+from kye.vm.kernels import KERNELS, Kernel
+from kye.vm.engine import Engine
+
+if t.TYPE_CHECKING:
+    from kye.vm.vm import VM
+
+# The Arrow array of each column, so that a column is only converted once
+ARRAYS: weakref.WeakKeyDictionary[Column, pa.Array] = weakref.WeakKeyDictionary()
+
+CAST_TYPES = {
+    'float': pa.float64(),
+}
+
+def to_arrow(col: Column) -> pa.Array:
+    arr = ARRAYS.get(col)
+    if arr is None:
+        arr = pa.array(col.values, mask=col.nulls, from_pandas=True)
+        ARRAYS[col] = arr
+    return arr
+
+def from_arrow(index: pd.Index, arr: pa.Array, nulls: t.Optional[np.ndarray] = None) -> Column:
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    if arr.null_count > 0:
+        is_null = arr.is_null().to_numpy(zero_copy_only=False)
+        nulls = is_null if nulls is None else nulls | is_null
+        if pa.types.is_boolean(arr.type) or pa.types.is_integer(arr.type):
+            arr = pc.fill_null(arr, pa.scalar(False if pa.types.is_boolean(arr.type) else 0, arr.type))
+    values = arr.to_numpy(zero_copy_only=False)
+    if values.dtype.kind == 'f':
+        is_nan = np.isnan(values)
+        if is_nan.any():
+            nulls = is_nan if nulls is None else nulls | is_nan
+    col = Column(index, values, nulls)
+    if col.nulls is None:
+        ARRAYS[col] = arr
+    return col
+
+def compute(fn: t.Callable, op: OP, vm: VM, *args: t.Any) -> Column:
+    """
+    Run an Arrow kernel over the column arguments, passing any other
+    arguments through unchanged. Rows that are null in any column
+    argument stay null, like they do for the pandas kernels.
+    """
+    columns = [i for i, arg in enumerate(args) if isinstance(arg, Column)]
+    assert 0 < len(columns) <= 2
+    args = list(args)
+    if len(columns) == 2:
+        args[columns[0]], args[columns[1]] = args[columns[0]].align(args[columns[1]])
+    nulls = None
+    for i in columns:
+        if args[i].nulls is not None:
+            nulls = args[i].nulls if nulls is None else nulls | args[i].nulls
+    try:
+        result = fn(*(to_arrow(arg) if isinstance(arg, Column) else arg for arg in args))
+    except (pa.ArrowException, TypeError, ValueError):
+        return KERNELS[op](vm, *args)
+    return from_arrow(args[columns[0]].index, result, nulls)
+
+def load_column(vm: VM, col_name: str) -> Column:
+    if col_name not in vm.df:
+        raise ValueError(f'Column not found: {col_name}')
+    col = vm.df[col_name]
+    index = vm.df.index
+    values = col.to_numpy()
+    if col_name in vm.lists:
+        # Already flattened by another of the chunk's VMs
+        lists = vm.lists[col_name]
+        index, values = lists.repeat(index), lists.values
+    try:
+        arr = pa.array(values, from_pandas=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        return vm.get_column(col_name)
+    if pa.types.is_list(arr.type) and col_name not in vm.lists:
+        # Empty lists explode into null rows, which Arrow would drop
+        lengths = pc.list_value_length(arr)
+        if lengths.null_count > 0 or pc.any(pc.equal(lengths, 0)).as_py():
+            return vm.get_column(col_name)
+        index = index.take(pc.list_parent_indices(arr).to_numpy())
+        arr = pc.list_flatten(arr)
+    elif pa.types.is_null(arr.type) or pa.types.is_nested(arr.type):
+        return vm.get_column(col_name)
+    return from_arrow(index, arr)
+
+def cast(vm: VM, col: Column, dtype: str) -> Column:
+    if dtype not in CAST_TYPES:
+        return KERNELS[OP.CAST](vm, col, dtype)
+    try:
+        return from_arrow(col.index, pc.cast(to_arrow(col), CAST_TYPES[dtype]), col.nulls)
+    except (pa.ArrowException, TypeError, ValueError):
+        # The pandas kernel accepts more formats, and reports the error otherwise
+        return KERNELS[OP.CAST](vm, col, dtype)
+
+def count(vm: VM, col: Column) -> Column:
+    if not col.index.is_unique and col.index.nlevels == 1:
+        try:
+            table = pa.table({
+                'index': pa.array(col.index.to_numpy(), from_pandas=True),
+                'values': to_arrow(col),
+            })
+        except (pa.ArrowException, TypeError, ValueError):
+            return KERNELS[OP.COUNT](vm, col)
+        if col.nulls is not None:
+            table = table.filter(pa.array(~col.nulls))
+        counts = table.group_by('index').aggregate([('values', 'count_distinct')]).sort_by('index')
+        index = pd.Index(counts['index'].to_numpy(), name=col.index.name)
+        return from_arrow(index, counts['values_count_distinct'])
+    return KERNELS[OP.COUNT](vm, col)
+
+def _divide(left: t.Any, right: t.Any) -> pa.Array:
+    # Always divide as floats, like pandas does
+    if isinstance(left, pa.Array):
+        left = pc.cast(left, pa.float64())
+    else:
+        right = pc.cast(right, pa.float64())
+    return pc.divide(left, right)
+
+def _invert(col: pa.Array) -> pa.Array:
+    # `~` is bitwise for integers, so only booleans are handled here
+    if not pa.types.is_boolean(col.type):
+        raise TypeError('Expected a boolean array')
+    return pc.invert(col)
+
+def _between(col: pa.Array, lower: t.Any, upper: t.Any, inclusive: str) -> pa.Array:
+    above = pc.greater_equal if inclusive in ('both', 'left') else pc.greater
+    below = pc.less_equal if inclusive in ('both', 'right') else pc.less
+    return pc.and_(above(col, lower), below(col, upper))
+
+def _is_in(col: pa.Array, values: t.List[t.Any]) -> pa.Array:
+    return pc.is_in(col, value_set=pa.array(values))
+
+def _not_in(col: pa.Array, values: t.List[t.Any]) -> pa.Array:
+    return pc.invert(_is_in(col, values))
+
+def _concat(left: t.Any, right: t.Any) -> pa.Array:
+    return pc.binary_join_element_wise(left, right, '')
+
+def kernel(op: OP, fn: t.Callable) -> Kernel:
+    return partial(compute, fn, op)
+
+ARROW = Engine('arrow', {
+    OP.COL: load_column,
+    OP.CAST: cast,
+    OP.COUNT: count,
+    OP.NOT: kernel(OP.NOT, _invert),
+    OP.NEG: kernel(OP.NEG, pc.negate),
+    OP.LEN: kernel(OP.LEN, pc.utf8_length),
+    OP.EQ: kernel(OP.EQ, pc.equal),
+    OP.NE: kernel(OP.NE, pc.not_equal),
+    OP.LT: kernel(OP.LT, pc.less),
+    OP.GT: kernel(OP.GT, pc.greater),
+    OP.LE: kernel(OP.LE, pc.less_equal),
+    OP.GE: kernel(OP.GE, pc.greater_equal),
+    OP.ADD: kernel(OP.ADD, pc.add),
+    OP.SUB: kernel(OP.SUB, pc.subtract),
+    OP.MUL: kernel(OP.MUL, pc.multiply),
+    OP.DIV: kernel(OP.DIV, _divide),
+    OP.BETWEEN: kernel(OP.BETWEEN, _between),
+    OP.IN: kernel(OP.IN, _is_in),
+    OP.NOT_IN: kernel(OP.NOT_IN, _not_in),
+    OP.CONCAT: kernel(OP.CONCAT, _concat),
+    OP.MATCHES: kernel(OP.MATCHES, pc.match_substring_regex),
+})
@@ -0,0 +1,253 @@
+from __future__ import annotations
+import typing as t
+import pandas as pd
+import numpy as np
+
+Kernel = t.Callable[..., t.Any]
+
+# Columns are dictionary-encoded when a sample of their values
+# has at most this fraction of distinct values
+DICTIONARY_SAMPLE_SIZE = 1000
+DICTIONARY_MAX_RATIO = 0.1
+
+def scatter(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """ Spread `values` over the positions where `mask` is True """
+    dtype = values.dtype if isinstance(values.dtype, np.dtype) else np.dtype(object)
+    if dtype == object:
+        out = np.empty(len(mask), dtype=object)
+    else:
+        out = np.zeros(len(mask), dtype=dtype)
+    out[mask] = values
+    return out
+
+def infer_objects(col: pd.Series) -> pd.Series:
+    """ Convert a column of objects to the dtype of its values """
+    # Strings stay objects, so they don't need to be tried as every other dtype
+    if col.dtype == object and pd.api.types.infer_dtype(col, skipna=True) in ('string', 'bytes'):
+        return col
+    return col.infer_objects()
+
+class Selection(t.NamedTuple):
+    """ The rows of `index` that still need to be computed """
+    index: pd.Index
+    mask: np.ndarray
+
+    def covers(self, index: pd.Index) -> bool:
+        return index is self.index or index.equals(self.index)
+
+class Column:
+    """
+    A VM operand: an array of values aligned to an index of row ids,
+    plus an optional mask of the null positions.
+
+    Operands loaded from the same table share the same index object,
+    so operations between them are plain array operations. Operands are
+    only realigned when their index really differs, like after loading
+    a many-valued edge or computing an aggregate.
+
+    Low-cardinality string columns can also be held as a dictionary of
+    codes into a small table of values. Kernels then run once per
+    distinct value, and the values are only expanded when needed.
+
+    A temporary column holds an intermediate result that only the next
+    kernel will read, so that kernel may write its output into it.
+    """
+    index: pd.Index
+    nulls: t.Optional[np.ndarray]
+    dictionary: t.Optional[t.Tuple[np.ndarray, np.ndarray]]
+    temporary: bool
+
+    def __init__(self,
+                 index: pd.Index,
+                 values: t.Optional[np.ndarray] = None,
+                 nulls: t.Optional[np.ndarray] = None,
+                 dictionary: t.Optional[t.Tuple[np.ndarray, np.ndarray]] = None,
+                 ):
+        assert values is not None or dictionary is not None
+        self.index = index
+        self._values = values
+        self.nulls = nulls if nulls is not None and nulls.any() else None
+        self.dictionary = dictionary
+        self.temporary = False
+        self._checked_cardinality = dictionary is not None
+        assert len(index) == len(self)
+
+    def __len__(self):
+        if self._values is not None:
+            return len(self._values)
+        assert self.dictionary is not None
+        return len(self.dictionary[0])
+
+    @property
+    def values(self) -> np.ndarray:
+        if self._values is None:
+            assert self.dictionary is not None
+            codes, table = self.dictionary
+            if len(table) == 0:
+                self._values = np.empty(len(codes), dtype=object)
+            else:
+                self._values = table.take(np.where(codes < 0, 0, codes))
+        return self._values
+
+    def encode(self) -> t.Optional[t.Tuple[np.ndarray, np.ndarray]]:
+        """ Dictionary-encode the column if it holds few distinct strings """
+        if not self._checked_cardinality:
+            self._checked_cardinality = True
+            if self.values.dtype == object and is_low_cardinality(self.values, self.nulls):
+                codes, table = pd.factorize(self.values)
+                # Only strings, so that values like `1` and `True` are not merged
+                if pd.api.types.infer_dtype(table, skipna=False) == 'string':
+                    self.dictionary = (codes, np.asarray(table, dtype=object))
+        return self.dictionary
+
+    @staticmethod
+    def from_series(col: pd.Series) -> Column:
+        nulls = col.isna().to_numpy()
+        if not nulls.any():
+            return Column(col.index, infer_objects(col).to_numpy())
+        valid = infer_objects(col[~nulls])
+        return Column(col.index, scatter(valid.to_numpy(), ~nulls), nulls)
+
+    @staticmethod
+    def constant(value: t.Any, index: pd.Index) -> Column:
+        return Column(index, pd.Series(value, index=index).to_numpy())
+
+    def to_series(self) -> pd.Series:
+        index, values = self.index, self.values
+        if self.nulls is not None:
+            valid = ~self.nulls
+            index, values = index[valid], values[valid]
+        col = pd.Series(values, index=index)
+        # Duplicate index values are only allowed if they each have a different value
+        if not index.is_unique:
+            duplicated = pd.DataFrame({'index': index, 'value': values}).duplicated()
+            col = col[~duplicated.to_numpy()]
+        return col
+
+    def isnull(self) -> Column:
+        if self.nulls is None:
+            return Column(self.index, np.zeros(len(self), dtype=bool))
+        return Column(self.index, self.nulls.copy())
+
+    def notnull(self) -> Column:
+        if self.nulls is None:
+            return Column(self.index, np.ones(len(self), dtype=bool))
+        return Column(self.index, ~self.nulls)
+
+    def reindex(self, index: pd.Index, indexer: t.Optional[np.ndarray]) -> Column:
+        """ Take the rows at `indexer`, where -1 marks a row missing from this column """
+        if indexer is None:
+            return Column(index, self.values, self.nulls)
+        missing = indexer < 0
+        if len(self.values) == 0:
+            return Column(index, np.empty(len(indexer), dtype=object), missing)
+        values = self.values.take(np.where(missing, 0, indexer))
+        nulls = missing if self.nulls is None else missing | self.nulls.take(np.where(missing, 0, indexer))
+        return Column(index, values, nulls)
+
+    def align(self, other: Column) -> t.Tuple[Column, Column]:
+        if self.index is other.index:
+            return self, other
+        if self.index.equals(other.index):
+            return self, other.reindex(self.index, None)
+        index, left, right = self.index.join(other.index, how='outer', return_indexers=True)
+        return self.reindex(index, left), other.reindex(index, right)
+
+def is_low_cardinality(values: np.ndarray, nulls: t.Optional[np.ndarray]) -> bool:
+    """ Estimate the number of distinct values from an evenly spaced sample """
+    step = max(len(values) // DICTIONARY_SAMPLE_SIZE, 1)
+    sample = values[::step]
+    if nulls is not None:
+        sample = sample[~nulls[::step]]
+    if len(sample) == 0:
+        return False
+    return len(pd.unique(sample)) <= DICTIONARY_MAX_RATIO * len(sample)
+
+def shared_codes(columns: t.List[Column]) -> t.Optional[np.ndarray]:
+    """ Find the dictionary codes that all of the columns are encoded with """
+    if len(columns) == 1:
+        dictionary = columns[0].encode()
+        return dictionary[0] if dictionary is not None else None
+    codes = [col.dictionary[0] if col.dictionary is not None else None for col in columns]
+    if codes[0] is not None and all(code is codes[0] for code in codes):
+        return codes[0]
+    return None
+
+def apply(fn: Kernel, *args: t.Any, selection: t.Optional[Selection] = None) -> Column:
+    """
+    Run a kernel over the values of the column arguments, passing any
+    other arguments through unchanged. Null rows are never passed to
+    the kernel, and any nulls produced by the kernel are masked out.
+
+    If given a selection, rows outside of it are skipped and left null.
+    """
+    columns = [i for i, arg in enumerate(args) if isinstance(arg, Column)]
+    assert 0 < len(columns) <= 2
+    args = list(args)
+    if len(columns) == 2:
+        args[columns[0]], args[columns[1]] = args[columns[0]].align(args[columns[1]])
+    index = args[columns[0]].index
+    nulls = None
+    for i in columns:
+        if args[i].nulls is not None:
+            nulls = args[i].nulls if nulls is None else nulls | args[i].nulls
+    codes = shared_codes([args[i] for i in columns])
+    if codes is not None:
+        return apply_dictionary(fn, args, columns, codes, index, nulls)
+    valid = None if nulls is None else ~nulls
+    if selection is not None and selection.covers(index):
+        valid = selection.mask if valid is None else valid & selection.mask
+    for i in columns:
+        values = args[i].values if valid is None else args[i].values[valid]
+        args[i] = pd.Series(values, copy=False)
+    result = fn(*args)
+    if not isinstance(result, pd.Series):
+        result = pd.Series(result, copy=False)
+    result_nulls = result.isna().to_numpy()
+    values = result.to_numpy()
+    if valid is None:
+        return Column(index, values, result_nulls)
+    return Column(index, scatter(values, valid), ~scatter(~result_nulls, valid))
+
+def apply_dictionary(fn: Kernel,
+                     args: t.List[t.Any],
+                     columns: t.List[int],
+                     codes: np.ndarray,
+                     index: pd.Index,
+                     nulls: t.Optional[np.ndarray],
+                     ) -> Column:
+    """ Run the kernel once per distinct value and keep the result encoded with the same codes """
+    for i in columns:
+        args[i] = pd.Series(args[i].dictionary[1], copy=False)
+    result = fn(*args)
+    if not isinstance(result, pd.Series):
+        result = pd.Series(result, copy=False)
+    result_nulls = result.isna().to_numpy()
+    if result_nulls.any():
+        code_nulls = result_nulls.take(np.where(codes < 0, 0, codes))
+        nulls = code_nulls if nulls is None else nulls | code_nulls
+    return Column(index, nulls=nulls, dictionary=(codes, result.to_numpy()))
+
+def logical(fn: Kernel, left: Column, right: t.Any, selection: t.Optional[Selection] = None) -> Column:
+    """
+    Run a boolean kernel like `&` or `|`. A row that is null on only
+    one side evaluates to False, matching pandas' alignment of
+    boolean series; rows null on both sides stay null.
+    """
+    if not isinstance(right, Column):
+        return apply(fn, left, right, selection=selection)
+    left, right = left.align(right)
+    if left.nulls is right.nulls or (
+        left.nulls is not None and right.nulls is not None
+        and np.array_equal(left.nulls, right.nulls)
+    ):
+        return apply(fn, left, right, selection=selection)
+    left_nulls = left.nulls if left.nulls is not None else np.zeros(len(left), dtype=bool)
+    right_nulls = right.nulls if right.nulls is not None else np.zeros(len(right), dtype=bool)
+    result = fn(
+        pd.Series(np.where(left_nulls, False, left.values)),
+        pd.Series(np.where(right_nulls, False, right.values)),
+    )
+    values = np.asarray(result, dtype=bool)
+    values[left_nulls ^ right_nulls] = False
+    return Column(left.index, values, left_nulls & right_nulls)
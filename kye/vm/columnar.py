@@ -0,0 +1,187 @@
+"""
+Sources for columnar files written with Arrow: Parquet, and Feather or
+Arrow IPC files. Only the columns that the model uses are read, and
+Arrow IPC files are memory-mapped, so their column buffers are read in
+place instead of copied.
+
+Parquet files are read a row group at a time, and the minimum and
+maximum of each column in each row group are kept, so that the loader
+can skip the assertions that a row group is known to pass.
+"""
+from __future__ import annotations
+import typing as t
+from pathlib import Path
+
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from kye.vm.source import Source
+from kye.vm.statistics import ColumnStatistics
+
+def select_columns(schema: pa.Schema, usecols: t.Optional[t.Callable[[str], bool]]) -> t.List[str]:
+    if usecols is None:
+        return schema.names
+    return [name for name in schema.names if usecols(name)]
+
+def to_frame(table: t.Union[pa.Table, pa.RecordBatch], start: int, dtype: t.Optional[t.Dict[str, t.Any]] = None) -> pd.DataFrame:
+    """
+    Convert a chunk of Arrow rows to a frame numbered from `start`.
+    Dictionary columns are decoded, and columns that should be read as
+    strings are cast to strings, like a text file would have read them.
+    """
+    columns = []
+    for name, col in zip(table.column_names, table.columns):
+        if pa.types.is_dictionary(col.type):
+            col = col.cast(col.type.value_type)
+        if dtype is not None and dtype.get(name) is object and not pa.types.is_string(col.type):
+            try:
+                col = col.cast(pa.string())
+            except pa.ArrowNotImplementedError:
+                pass
+        columns.append(col)
+    df = pa.table(columns, names=table.column_names).to_pandas(split_blocks=True)
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+class ParquetSource(Source):
+    path: Path
+    chunksize: t.Optional[int]
+    # The row groups that are read, or all of them if None
+    row_groups: t.Optional[range]
+    # The first row of each row group, and the statistics of each
+    # column in each row group, read from the file's footer when needed
+    row_group_starts: t.Optional[np.ndarray]
+    row_group_statistics: t.Dict[str, t.List[t.Optional[ColumnStatistics]]]
+
+    def __init__(self, path: Path, chunksize: t.Optional[int] = None, row_groups: t.Optional[range] = None):
+        self.path = path
+        self.chunksize = chunksize
+        self.row_groups = row_groups
+        self.row_group_starts = None
+        self.row_group_statistics = {}
+
+    def chunks(self, dtype: t.Optional[t.Dict[str, t.Any]] = None, chunksize: t.Optional[int] = None, usecols: t.Optional[t.Callable[[str], bool]] = None) -> t.Iterator[pd.DataFrame]:
+        chunksize = chunksize or self.chunksize
+        with pq.ParquetFile(self.path, memory_map=True) as file:
+            columns = select_columns(file.schema_arrow, usecols)
+            row_groups = self.row_groups if self.row_groups is not None else range(file.num_row_groups)
+            if len(row_groups) == 0:
+                yield to_frame(file.schema_arrow.empty_table().select(columns), 0, dtype)
+                return
+            # Rows keep their numbers in the whole file
+            metadata = file.metadata
+            start = sum(metadata.row_group(i).num_rows for i in range(row_groups.start))
+            if chunksize is None:
+                for i in row_groups:
+                    row_group = file.read_row_group(i, columns=columns)
+                    yield to_frame(row_group, start, dtype)
+                    start += row_group.num_rows
+                return
+            for batch in file.iter_batches(batch_size=chunksize, row_groups=row_groups, columns=columns):
+                yield to_frame(batch, start, dtype)
+                start += batch.num_rows
+
+    def split(self, count: int) -> t.List[Source]:
+        # Each piece reads whole row groups, with about the same number of rows
+        with pq.ParquetFile(self.path) as file:
+            metadata = file.metadata
+        num_rows = np.array([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        if count < 2 or len(num_rows) < 2:
+            return [self]
+        ends = np.cumsum(num_rows)
+        targets = ends[-1] * np.arange(1, count) // count
+        starts = np.unique(np.concatenate([[0], np.searchsorted(ends, targets, side='right'), [len(num_rows)]]))
+        return [
+            ParquetSource(self.path, self.chunksize, range(start, stop))
+            for start, stop in zip(starts[:-1], starts[1:])
+        ]
+
+    def read_statistics(self):
+        with pq.ParquetFile(self.path) as file:
+            metadata = file.metadata
+        num_rows = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        self.row_group_starts = np.cumsum([0] + num_rows[:-1])
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                col = row_group.column(j)
+                stats = col.statistics
+                self.row_group_statistics.setdefault(col.path_in_schema, []).append(
+                    ColumnStatistics(stats.min, stats.max)
+                    if stats is not None and stats.has_min_max else None
+                )
+
+    def statistics(self, col_name: str, start: int, stop: int) -> t.Optional[ColumnStatistics]:
+        if self.row_group_starts is None:
+            self.read_statistics()
+        assert self.row_group_starts is not None
+        if col_name not in self.row_group_statistics or stop <= start:
+            return None
+        first, last = np.searchsorted(self.row_group_starts, [start, stop - 1], side='right') - 1
+        row_groups = self.row_group_statistics[col_name][first:last + 1]
+        if any(stats is None for stats in row_groups):
+            return None
+        try:
+            return ColumnStatistics(
+                min(stats.min for stats in row_groups),
+                max(stats.max for stats in row_groups),
+            )
+        except TypeError:
+            return None
+
+class ArrowFileSource(Source):
+    """ A Feather or Arrow IPC file """
+    path: Path
+    chunksize: t.Optional[int]
+    # The record batches that are read, or all of them if None, and the
+    # row number of the first one
+    batches: t.Optional[range]
+    start: int
+
+    def __init__(self, path: Path, chunksize: t.Optional[int] = None, batches: t.Optional[range] = None, start: int = 0):
+        self.path = path
+        self.chunksize = chunksize
+        self.batches = batches
+        self.start = start
+
+    def chunks(self, dtype: t.Optional[t.Dict[str, t.Any]] = None, chunksize: t.Optional[int] = None, usecols: t.Optional[t.Callable[[str], bool]] = None) -> t.Iterator[pd.DataFrame]:
+        chunksize = chunksize or self.chunksize
+        with pa.memory_map(str(self.path)) as file:
+            schema = ipc.open_file(file).schema
+            columns = select_columns(schema, usecols)
+            # Only the model's columns are read, or decompressed if the file is compressed
+            reader = ipc.open_file(file, options=ipc.IpcReadOptions(
+                included_fields=[schema.get_field_index(name) for name in columns],
+            ))
+            if chunksize is None and self.batches is None:
+                yield to_frame(reader.read_all(), 0, dtype)
+                return
+            start = self.start
+            for i in self.batches if self.batches is not None else range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for offset in range(0, batch.num_rows, chunksize or max(batch.num_rows, 1)):
+                    chunk = batch.slice(offset, chunksize)
+                    yield to_frame(chunk, start, dtype)
+                    start += chunk.num_rows
+
+    def split(self, count: int) -> t.List[Source]:
+        # Each piece reads whole record batches, with about the same number of rows
+        with pa.memory_map(str(self.path)) as file:
+            schema = ipc.open_file(file).schema
+            if count < 2 or len(schema) == 0:
+                return [self]
+            # Only the first column is read to count the rows of each batch
+            reader = ipc.open_file(file, options=ipc.IpcReadOptions(included_fields=[0]))
+            num_rows = np.array([reader.get_batch(i).num_rows for i in range(reader.num_record_batches)])
+        if len(num_rows) < 2:
+            return [self]
+        ends = np.cumsum(num_rows)
+        targets = ends[-1] * np.arange(1, count) // count
+        starts = np.unique(np.concatenate([[0], np.searchsorted(ends, targets, side='right'), [len(num_rows)]]))
+        return [
+            ArrowFileSource(self.path, self.chunksize, range(start, stop), int(ends[start - 1]) if start > 0 else 0)
+            for start, stop in zip(starts[:-1], starts[1:])
+        ]
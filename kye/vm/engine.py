@@ -0,0 +1,38 @@
+from __future__ import annotations
+import typing as t
+
+from kye.vm.op import OP
+from kye.vm.kernels import KERNELS, Kernel
+
+class Engine:
+    """
+    The kernels that the VM runs each operation with.
+
+    The pandas engine is the default and supports every operation.
+    Other engines can replace any of its kernels, and fall back to
+    it for the rest.
+    """
+    name: str
+    kernels: t.Dict[OP, Kernel]
+
+    def __init__(self, name: str, kernels: t.Dict[OP, Kernel]):
+        self.name = name
+        self.kernels = {**KERNELS, **kernels}
+
+    def __repr__(self):
+        return f'Engine({self.name})'
+
+PANDAS = Engine('pandas', {})
+
+ENGINES = ('pandas', 'arrow')
+
+def get_engine(name: str) -> Engine:
+    if name == 'pandas':
+        return PANDAS
+    if name == 'arrow':
+        try:
+            from kye.vm.arrow import ARROW
+        except ImportError as e:
+            raise ImportError("The 'arrow' engine requires pyarrow to be installed") from e
+        return ARROW
+    raise ValueError(f"Unknown engine '{name}', expected one of: {', '.join(ENGINES)}")
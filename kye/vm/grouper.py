@@ -0,0 +1,607 @@
+"""
+Groups the rows of a model by its index as they are loaded, one chunk at
+a time, and then runs the checks that need every row of the table: that
+sub-indexes are unique, that each group has the right number of values,
+and that the indexes do not conflict.
+
+Only what those checks need is kept between chunks: the index values of
+each group, the first value and the number of distinct values of each
+column in each group, and which group each row went to. Many-valued
+columns keep the distinct values of each group. Past the memory budget,
+the index values are written to disk and checked a partition at a time.
+"""
+from __future__ import annotations
+import typing as t
+import itertools
+
+import pandas as pd
+import numpy as np
+
+from kye.errors.validation_errors import ValidationErrorReporter
+import kye.compiled as c
+from kye.vm.keys import encode_keys, MAX_KEY_SPACE
+from kye.vm.lists import ListArray
+from kye.vm.spill import KeyStore, GroupCounter
+from kye.vm.scheduler import Scheduler, SERIAL
+
+if t.TYPE_CHECKING:
+    from kye.vm.table import Table
+
+def common_dtype(dtypes: t.Sequence[t.Any]) -> t.Any:
+    """ The dtype a column would have had if its chunks were read as one """
+    dtypes = list(dict.fromkeys(dtypes))
+    if len(dtypes) == 1:
+        return dtypes[0]
+    if all(isinstance(dtype, np.dtype) and dtype.kind in 'iuf' for dtype in dtypes):
+        return np.result_type(*dtypes)
+    return np.dtype(object)
+
+def is_first_value(groups: np.ndarray, values: t.Any) -> np.ndarray:
+    """
+    Mask of the first time each value is seen in each of the groups.
+    The values are numbered once, and then the pairs of group and value
+    number are sorted, which needs less memory than hashing the pairs.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    width = max(len(uniques), 1)
+    if len(groups) and int(groups.max()) >= MAX_KEY_SPACE // width:
+        return ~pd.DataFrame({'group': groups, 'value': codes}).duplicated().to_numpy()
+    _, first = np.unique(groups * width + codes, return_index=True)
+    is_first = np.zeros(len(codes), dtype=bool)
+    is_first[first] = True
+    return is_first
+
+def unique_by_group(col: pd.Series) -> t.Tuple[pd.Series, pd.Series]:
+    """
+    The number of distinct values, and the distinct values in the order
+    they were added, of each group of a column indexed by group. The
+    values are sorted by group once and split where each group starts.
+    """
+    if len(col) == 0:
+        return pd.Series([], index=col.index, dtype=np.int64), col
+    order = np.argsort(col.index.to_numpy(), kind='stable')
+    groups = col.index.to_numpy()[order]
+    values = col.to_numpy()[order] if isinstance(col.dtype, np.dtype) else col.array.take(order)
+    is_first = is_first_value(groups, values)
+    groups, values = groups[is_first], values[is_first]
+    keys, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+    unique = np.empty(len(keys), dtype=object)
+    for i, (start, count) in enumerate(zip(starts, counts)):
+        unique[i] = values[start:start + count]
+    return pd.Series(counts, index=keys), pd.Series(unique, index=keys)
+
+class Grouper:
+    """
+    Each chunk's rows are first grouped on their own, into partial groups
+    that only keep what the checks need. The partial groups of every
+    chunk are merged into the table's groups once all rows are added.
+    """
+    model: c.Model
+    num_partials: int
+    # Index values of each partial group, in columns numbered by their
+    # position in the index and with the partial group in 'partial'.
+    # Past the memory budget they are written to disk
+    labels: KeyStore
+    # Row id of the first row of each partial group
+    first_rows: t.List[np.ndarray]
+    # Row ids, and the partial group of each row. Rows with a null index
+    # value are numbered -1, -2, ... in the order they are kept in `null_rows`
+    rows: t.List[np.ndarray]
+    row_partials: t.List[np.ndarray]
+    null_rows: t.List[pd.DataFrame]
+    num_null_rows: int
+    # First value of each partial group of a single-valued column,
+    # and how many distinct values it had, counting up to 2
+    firsts: t.Dict[str, t.List[pd.Series]]
+    counts: t.Dict[str, t.List[np.ndarray]]
+    # Distinct values of each partial group of a many-valued column
+    values: t.Dict[str, t.List[pd.Series]]
+    dtypes: t.Dict[str, t.List[t.Any]]
+    # Bytes the index checks can use before spilling to disk, or None for no limit
+    memory_budget: t.Optional[int]
+    scheduler: Scheduler
+
+    def __init__(self, model: c.Model, memory_budget: t.Optional[int] = None, scheduler: Scheduler = SERIAL):
+        self.model = model
+        self.memory_budget = memory_budget
+        self.scheduler = scheduler
+        self.num_partials = 0
+        self.labels = KeyStore(len(model.index), memory_budget)
+        self.first_rows = []
+        self.rows = []
+        self.row_partials = []
+        self.null_rows = []
+        self.num_null_rows = 0
+        self.firsts = {}
+        self.counts = {}
+        self.values = {}
+        self.dtypes = {}
+
+    @property
+    def columns(self) -> t.List[str]:
+        return list(self.dtypes)
+
+    def add(self, df: pd.DataFrame, mask: t.Optional[np.ndarray] = None, lists: t.Optional[t.Dict[str, ListArray]] = None):
+        """
+        Add the rows of a chunk, where `mask` selects the rows that passed
+        the row checks. Columns that were already flattened can be given
+        in `lists`, so they are not flattened again.
+        """
+        lists = lists if lists is not None else {}
+        for col_name in df.columns:
+            self.dtypes.setdefault(col_name, []).append(df[col_name].dtype)
+            if self.model[col_name].many:
+                self.values.setdefault(col_name, [])
+            else:
+                self.firsts.setdefault(col_name, [])
+                self.counts.setdefault(col_name, [])
+        if mask is not None:
+            df = df[mask]
+            lists = {col_name: col.take(mask) for col_name, col in lists.items()}
+        if df.empty:
+            return
+
+        index_df = df[self.model.index]
+        keys = encode_keys(index_df)
+        is_null = keys < 0
+        unique_keys, first_rows = np.unique(keys, return_index=True)
+        if len(unique_keys) and unique_keys[0] < 0:
+            first_rows = first_rows[1:]
+        labels = pd.DataFrame({
+            i: index_df[col_name].to_numpy()[first_rows]
+            for i, col_name in enumerate(self.model.index)
+        })
+        labels['partial'] = np.arange(self.num_partials, self.num_partials + len(first_rows))
+        self.labels.append(labels)
+        self.first_rows.append(df.index.to_numpy()[first_rows])
+
+        row_partials = keys + self.num_partials
+        if is_null.any():
+            num_null_rows = int(is_null.sum())
+            row_partials[is_null] = -1 - self.num_null_rows - np.arange(num_null_rows)
+            self.null_rows.append(index_df[is_null])
+            self.num_null_rows += num_null_rows
+        self.rows.append(df.index.to_numpy())
+        self.row_partials.append(row_partials)
+        self.num_partials += len(first_rows)
+
+        # Rows with a null index have no group to add their values to
+        is_valid = ~is_null
+        groups = row_partials[is_valid]
+        columns = df.columns.tolist()
+        results = self.scheduler.map(
+            lambda col_name: self.group_column(
+                col_name,
+                (lists[col_name] if col_name in lists else ListArray.from_series(df[col_name])).take(is_valid),
+                groups,
+                len(first_rows),
+            ),
+            columns,
+        )
+        for col_name, (col, counts) in zip(columns, results):
+            if counts is None:
+                self.values[col_name].append(col)
+            else:
+                self.firsts[col_name].append(col)
+                self.counts[col_name].append(counts)
+
+    def group_column(self, col_name: str, values: ListArray, groups: np.ndarray, num_groups: int) -> t.Tuple[pd.Series, t.Optional[np.ndarray]]:
+        """
+        Group a column's values by their partial group. Returns the distinct
+        values of a many-valued column, or else the first value and number
+        of distinct values of each group.
+        """
+        col = values.to_series(groups).dropna()
+        if self.model[col_name].many:
+            if len(col) > num_groups:
+                # Only the distinct values of each group are needed
+                col = col[is_first_value(col.index.to_numpy(), col.to_numpy())]
+            return col, None
+        if col.index.is_unique:
+            return col, np.ones(len(col), dtype=np.uint8)
+        g = col.groupby(level=0)
+        return g.first(), np.minimum(g.nunique().to_numpy(), 2).astype(np.uint8)
+
+    def find_conflicts(self, df: pd.DataFrame, table: t.Optional[Table], positions: t.Optional[np.ndarray]) -> t.Dict[t.Tuple[int, int], np.ndarray]:
+        """
+        Find the groups whose values for one index are another group's
+        values for another index, for each pair of indexes with the same
+        number of columns. Equal values in the same position of either
+        index are the same value.
+
+        The values of all the indexes of the same length are counted in
+        one pass, and only the values that several groups share are
+        then matched up to find which pairs of indexes they conflict in.
+        """
+        model = self.model
+        lengths: t.Dict[int, t.List[int]] = {}
+        for index_id, idx in enumerate(model.indexes):
+            lengths.setdefault(len(idx), []).append(index_id)
+
+        conflicts = {}
+        for length, index_ids in lengths.items():
+            if len(index_ids) < 2:
+                continue
+            pairs = list(itertools.combinations(index_ids, 2))
+            for pair in pairs:
+                conflicts[pair] = np.zeros(len(df), dtype=bool)
+            groups = np.arange(len(df))
+            counter = GroupCounter(len(df) * len(index_ids), length, self.memory_budget)
+            for i, index_id in enumerate(index_ids):
+                counter.add(df[model.indexes[index_id]], groups, groups + i * len(df))
+            is_shared = counter.finish() > 1
+            groups = np.tile(groups, len(index_ids))
+            if is_shared.any():
+                # Indexes with no shared values are left out, so that their
+                # empty frames don't change the dtypes of the others
+                values = pd.concat([
+                    df[model.indexes[index_id]].set_axis(range(length), axis=1)[is_shared[i * len(df):(i + 1) * len(df)]]
+                    for i, index_id in enumerate(index_ids)
+                    if is_shared[i * len(df):(i + 1) * len(df)].any()
+                ], ignore_index=True)
+                shared = pd.DataFrame({
+                    'key': encode_keys(values),
+                    'index': np.repeat(index_ids, len(df))[is_shared],
+                    'group': groups[is_shared],
+                })
+                # Each group that shares a value with another group, and the indexes they have it in
+                matches = shared.merge(shared, on='key')
+                matches = matches[matches['group_x'] != matches['group_y']]
+                for (index_x, index_y), matched in matches.groupby(['index_x', 'index_y'])['group_x']:
+                    for pair in pairs:
+                        if index_x in pair and index_y in pair:
+                            conflicts[pair][matched.to_numpy()] = True
+
+            if positions is not None:
+                assert table is not None
+                # The values can't be in another of the table's groups either
+                group_keys = df.index.to_numpy()
+                own = np.where(group_keys >= 0, positions[np.maximum(group_keys, 0)], -1)
+                for idx1_id, idx2_id in pairs:
+                    for find_id, values_id in ((idx2_id, idx1_id), (idx1_id, idx2_id)):
+                        found = table.find(find_id, df[model.indexes[values_id]])
+                        conflicts[idx1_id, idx2_id] |= (found >= 0) & (found != own)
+        return conflicts
+
+    def combine(self, table: Table, col_name: str, positions: np.ndarray, nunique: t.Optional[pd.Series], values: pd.Series) -> t.Tuple[t.Optional[pd.Series], pd.Series]:
+        """
+        Combine the distinct value counts and values of a column's
+        groups with those of the same groups in the table
+        """
+        keys = np.flatnonzero(positions >= 0)
+        existing = pd.Series(table.take(col_name, positions[keys]), index=keys)
+        existing = existing[existing.notna()]
+        if existing.empty:
+            return nunique, values
+        if nunique is not None:
+            nunique = nunique.reindex(values.index.union(existing.index), fill_value=0)
+        if self.model[col_name].many:
+            combined = values.to_dict()
+            for key, old in existing.items():
+                combined[key] = pd.unique(np.concatenate([old, combined[key]])) if key in combined else old
+            values = pd.Series(combined, dtype=object).sort_index()
+            if nunique is not None:
+                nunique.loc[existing.index] += existing.map(len)
+        else:
+            current = values.reindex(existing.index)
+            differs = current.notna() & (current != existing)
+            nunique.loc[existing.index] = np.where(differs, 2, np.maximum(nunique.loc[existing.index], 1))
+            # Groups without a value in the rows added keep the table's value
+            missing = existing.index.difference(values.index)
+            if len(missing):
+                kept = existing.loc[missing].infer_objects()
+                values = pd.concat([values, kept]).sort_index() if len(values) else kept
+        return nunique, values
+
+    def dtype(self, col_name: str) -> t.Any:
+        return common_dtype(self.dtypes[col_name])
+
+    def group_labels(self) -> t.Iterator[t.Tuple[np.ndarray, pd.DataFrame]]:
+        """ The groups of each part of the labels once they are compacted, and their index values """
+        for _, labels in self.labels.parts():
+            yield labels['partial'].to_numpy(), self.index_values(labels)
+
+    def take_labels(self, groups: np.ndarray) -> pd.DataFrame:
+        """ The index values of the groups, in the order given """
+        positions = np.full(self.num_partials, -1, dtype=np.int64)
+        positions[groups] = np.arange(len(groups))
+        parts = []
+        for part_groups, index_values in self.group_labels():
+            part_positions = positions[part_groups]
+            is_taken = part_positions >= 0
+            parts.append(index_values[is_taken].set_axis(part_positions[is_taken]))
+        return pd.concat(parts).sort_index()
+
+    def index_values(self, labels: pd.DataFrame) -> pd.DataFrame:
+        """ The index values of some of the labels, with the dtypes they would have had if read as one """
+        return pd.DataFrame({
+            col_name: self.concat(col_name, [labels[i]])
+            for i, col_name in enumerate(self.model.index)
+        })
+
+    def drop_column(self, col_name: str):
+        for parts in (self.dtypes, self.firsts, self.counts, self.values):
+            parts.pop(col_name, None)
+
+    def concat(self, col_name: str, parts: t.Sequence[pd.Series]) -> pd.Series:
+        """ Join the parts of a column, with the dtype it would have had if read as one """
+        dtype = self.dtype(col_name)
+        # Empty parts are left out, since pandas will stop ignoring their dtype when joining
+        parts = [part for part in parts if len(part)] or parts[:1]
+        col = pd.concat(parts) if len(parts) > 1 else parts[0]
+        return col if col.dtype == dtype else col.astype(dtype)
+
+    def shift(self, num_rows: int):
+        """ Number the rows added after `num_rows` rows that were grouped apart from them """
+        self.first_rows = [first_rows + num_rows for first_rows in self.first_rows]
+        self.rows = [rows + num_rows for rows in self.rows]
+
+    def extend(self, other: Grouper):
+        """ Add the rows that another grouper of the same model has grouped """
+        for _, labels in other.labels.parts():
+            self.labels.append(labels.assign(partial=labels['partial'].to_numpy() + self.num_partials))
+        other.labels.close()
+        self.first_rows.extend(other.first_rows)
+        self.rows.extend(other.rows)
+        for row_partials in other.row_partials:
+            self.row_partials.append(np.where(
+                row_partials >= 0,
+                row_partials + self.num_partials,
+                row_partials - self.num_null_rows,
+            ))
+        self.null_rows.extend(other.null_rows)
+        self.num_null_rows += other.num_null_rows
+        for col_name, dtypes in other.dtypes.items():
+            self.dtypes.setdefault(col_name, []).extend(dtypes)
+        for state, other_state in ((self.firsts, other.firsts), (self.values, other.values)):
+            for col_name, parts in other_state.items():
+                state.setdefault(col_name, []).extend(
+                    part.set_axis(part.index + self.num_partials) for part in parts
+                )
+        for col_name, parts in other.counts.items():
+            self.counts.setdefault(col_name, []).extend(parts)
+        self.num_partials += other.num_partials
+
+    def compact(self):
+        """
+        Merge the partial groups that have the same index values, so that
+        each group is a single partial group. Groups are numbered in the
+        order of their first row, even when the rows were grouped by
+        several groupers.
+        """
+        if len(self.rows) == 0:
+            return
+        first_rows = np.concatenate(self.first_rows)
+        order = np.argsort(first_rows, kind='stable')
+        is_ordered = bool((order == np.arange(len(order))).all())
+        rows = np.concatenate(self.rows)
+        is_sorted = bool((rows[1:] > rows[:-1]).all())
+        if len(self.rows) == 1 and is_ordered and is_sorted:
+            return
+
+        # Merge the partial groups of each part of the labels, numbering
+        # the part's groups in the order of their first row
+        part_groups = np.empty(self.num_partials, dtype=np.int64)
+        part_first_rows = [np.empty(0, dtype=np.int64)]
+        num_part_groups = 0
+        for _, labels in self.labels.parts():
+            partials = labels['partial'].to_numpy()
+            partials_order = np.argsort(first_rows[partials], kind='stable')
+            codes = encode_keys(self.index_values(labels.iloc[partials_order]))
+            _, first_codes = np.unique(codes, return_index=True)
+            part_groups[partials[partials_order]] = codes + num_part_groups
+            part_first_rows.append(first_rows[partials[partials_order[first_codes]]])
+            num_part_groups += len(first_codes)
+
+        # Then number the groups of every part in the order of their first row
+        group_first_rows = np.concatenate(part_first_rows)
+        group_order = np.argsort(group_first_rows, kind='stable')
+        group_ids = np.empty_like(group_order)
+        group_ids[group_order] = np.arange(len(group_order))
+        partial_groups = group_ids[part_groups]
+        num_groups = len(group_order)
+        is_merged = num_groups < len(partial_groups)
+
+        # Each group is labelled with the index values of its first partial group
+        for part_id, labels in self.labels.parts():
+            partials = labels['partial'].to_numpy()
+            labels = labels[first_rows[partials] == group_first_rows[part_groups[partials]]]
+            self.labels.replace(part_id, labels.assign(partial=partial_groups[labels['partial'].to_numpy()]))
+
+        row_partials = np.concatenate(self.row_partials)
+        row_partials = np.where(row_partials >= 0, partial_groups[np.maximum(row_partials, 0)] if len(partial_groups) else 0, row_partials)
+        if not is_sorted:
+            row_order = np.argsort(rows, kind='stable')
+            rows, row_partials = rows[row_order], row_partials[row_order]
+        self.rows = [rows]
+        self.row_partials = [row_partials]
+        self.first_rows = [group_first_rows[group_order]]
+        self.null_rows = [pd.concat(self.null_rows)] if len(self.null_rows) > 1 else self.null_rows
+
+        for col_name in self.columns:
+            if self.model[col_name].many:
+                col = self.concat(col_name, self.values[col_name])
+                col.index = partial_groups[col.index.to_numpy()]
+                if is_merged:
+                    col = col[is_first_value(col.index.to_numpy(), col.to_numpy())]
+                self.values[col_name] = [col]
+            else:
+                first = self.concat(col_name, self.firsts[col_name])
+                counts = np.concatenate(self.counts[col_name])
+                first.index = partial_groups[first.index.to_numpy()]
+                if is_merged:
+                    # A group has many values if any of its partial groups
+                    # did, or if they had different first values
+                    g = first.groupby(level=0)
+                    max_counts = pd.Series(counts, index=first.index).groupby(level=0).max()
+                    counts = np.where(max_counts < 2, np.minimum(g.nunique(), 2), 2).astype(np.uint8)
+                    first = g.first()
+                self.firsts[col_name] = [first]
+                self.counts[col_name] = [counts]
+        self.num_partials = num_groups
+
+    def finish(self, reporter: ValidationErrorReporter, table: t.Optional[Table] = None) -> t.Optional[pd.DataFrame]:
+        """
+        Check the index and cardinality of all the rows added, and build
+        the table. The grouped values are let go of as they are used.
+
+        If a table is given, the groups it already has are checked
+        together with the rows added, but only the rows added are
+        reported and dropped when they fail.
+        """
+        model = self.model
+        if len(self.rows) == 0:
+            return pd.DataFrame(columns=self.columns, index=pd.Index([], name=model.name))
+        self.compact()
+        rows = np.concatenate(self.rows)
+        row_partials = np.concatenate(self.row_partials)
+        num_groups = self.num_partials
+        # Number the rows with a null index after the groups
+        entities = np.where(row_partials >= 0, row_partials, num_groups - 1 - row_partials)
+        num_entities = num_groups + self.num_null_rows
+        index_dtypes = {col_name: self.dtype(col_name) for col_name in model.index}
+        null_index = pd.concat([
+            null_rows.reset_index(drop=True).astype(index_dtypes)
+            for null_rows in self.null_rows
+        ], ignore_index=True) if self.num_null_rows else None
+
+        # Check that sub-indexes are unique to each other. The index
+        # values of the groups are counted a part of the labels at a time
+        keys = np.concatenate([np.arange(num_groups), np.full(self.num_null_rows, -1)])
+        is_valid = np.ones(num_entities, dtype=bool)
+        if len(model.indexes) > 1:
+            counters = [GroupCounter(num_entities, len(sub_idx_edges), self.memory_budget) for sub_idx_edges in model.indexes]
+            for groups, index_values in self.group_labels():
+                for counter, sub_idx_edges in zip(counters, model.indexes):
+                    counter.add(index_values[sub_idx_edges], groups, groups)
+            for counter, sub_idx_edges in zip(counters, model.indexes):
+                if null_index is not None:
+                    counter.add(null_index[sub_idx_edges], keys[num_groups:], np.arange(num_groups, num_entities))
+                counts = counter.finish()
+                invalid = (counts >= 0) & (counts != 1)
+                if invalid.any():
+                    is_valid &= ~invalid
+                    reporter.non_unique_sub_index(model, sub_idx_edges, rows[invalid[entities]])
+
+        # Find the groups that the table already has. Each sub-index's
+        # values must either all be new, or all belong to the same group
+        positions = None
+        if table is not None and table.num_groups > 0:
+            found = np.full((len(model.indexes), num_groups), -1, dtype=np.int64)
+            for groups, index_values in self.group_labels():
+                for index_id, sub_idx_edges in enumerate(model.indexes):
+                    found[index_id, groups] = table.find(index_id, index_values[sub_idx_edges])
+            positions = found.max(axis=0)
+            is_conflicting = (found != positions).any(axis=0)
+            for index_id, sub_idx_edges in enumerate(model.indexes):
+                invalid = np.zeros(num_entities, dtype=bool)
+                invalid[:num_groups] = is_conflicting & (found[index_id] >= 0)
+                if invalid.any():
+                    is_valid &= ~invalid
+                    reporter.non_unique_sub_index(model, sub_idx_edges, rows[invalid[entities]])
+            positions[~is_valid[:num_groups]] = -1
+
+        has_invalid = not is_valid.all()
+        if has_invalid:
+            is_kept = is_valid[entities]
+            rows, entities = rows[is_kept], entities[is_kept]
+            if len(rows) == 0:
+                return None
+
+        # Rows with a null in the index have no group. Only the index
+        # columns that they are missing are reported, and they are dropped
+        index_missing = {}
+        is_null_index = entities >= num_groups
+        if is_null_index.any():
+            null_rows = rows[is_null_index]
+            null_entities = entities[is_null_index]
+            for col_name in model.index:
+                is_missing = null_index[col_name].isna().to_numpy()[null_entities - num_groups]
+                if is_missing.any():
+                    index_missing[col_name] = null_rows[is_missing]
+            rows, entities = rows[~is_null_index], entities[~is_null_index]
+            if len(rows) == 0:
+                for col_name, missing_rows in index_missing.items():
+                    reporter.missing_values(model[col_name], missing_rows)
+                return None
+
+        # Run cardinality assertions and groupby the index
+        row_keys = keys[entities]
+        unique_keys, first_rows = np.unique(row_keys, return_index=True)
+        rows_by_key = pd.Series(rows, index=row_keys)
+        group_index = pd.Index(unique_keys, name=model.name)
+        mask = pd.Series(True, index=group_index)
+
+        def aggregate(col_name: str) -> t.Tuple[t.Optional[pd.Series], pd.Series]:
+            """ The number of distinct values and the values of each group of a column """
+            edge = model[col_name]
+            if edge.many:
+                col = self.concat(col_name, self.values.pop(col_name))
+                if has_invalid:
+                    col = col[is_valid[col.index.to_numpy()]]
+                nunique, values = unique_by_group(col)
+                if edge.none:
+                    nunique = None
+            else:
+                values = self.concat(col_name, self.firsts.pop(col_name))
+                nunique = pd.Series(np.concatenate(self.counts.pop(col_name)), index=values.index)
+                if has_invalid:
+                    is_kept = is_valid[values.index.to_numpy()]
+                    values, nunique = values[is_kept], nunique[is_kept]
+            if positions is not None:
+                nunique, values = self.combine(table, col_name, positions, nunique, values)
+            return nunique, values
+
+        # The columns are merged independently, and then checked in column order
+        results = self.scheduler.map(aggregate, self.columns)
+        grouped_columns = {}
+        for col_name, (nunique, values) in zip(self.columns, results):
+            edge = model[col_name]
+            if nunique is not None:
+                nunique = nunique.reindex(group_index, fill_value=0)
+                if not edge.many:
+                    has_many = nunique > 1
+                    if has_many.any():
+                        mask &= ~has_many
+                        reporter.multiple_values(model[col_name], rows_by_key.loc[has_many[has_many].index].to_numpy())
+                if not edge.none:
+                    is_null = nunique == 0
+                    if is_null.any():
+                        mask &= ~is_null
+                        reporter.missing_values(model[col_name], rows_by_key.loc[is_null[is_null].index].to_numpy())
+            if col_name in index_missing:
+                # The groups all have their index values, so these are the only missing ones
+                reporter.missing_values(model[col_name], index_missing.pop(col_name))
+            grouped_columns[col_name] = values
+        # The table is built at once rather than a column at a time
+        df = pd.DataFrame(grouped_columns, index=group_index)
+        first_entities = pd.Series(entities[first_rows], index=group_index)
+        if not mask.all():
+            df.drop(df[~mask].index, inplace=True)
+            if df.empty:
+                return None
+
+        # Check for index conflicts
+        if len(model.indexes) > 1:
+            conflicts = self.find_conflicts(df, table, positions)
+            mask = pd.Series(True, index=df.index)
+            for idx1_id, idx2_id in itertools.combinations(range(len(model.indexes)), 2):
+                # TODO: Check if compatible index types
+                if (idx1_id, idx2_id) not in conflicts:
+                    continue
+                is_invalid = conflicts[idx1_id, idx2_id]
+                if is_invalid.any():
+                    mask.iloc[is_invalid] = False
+                    invalid_rows = rows_by_key.loc[df.index[is_invalid]].to_numpy()
+                    idx1, idx2 = model.indexes[idx1_id], model.indexes[idx2_id]
+                    reporter.index_conflict(model, list(set(idx1) | set(idx2)), invalid_rows)
+            if not mask.all():
+                df.drop(df[~mask].index, inplace=True)
+                if df.empty:
+                    return None
+
+        # Label each group with the index values of its first row
+        index_df = self.take_labels(first_entities.loc[df.index].to_numpy())
+        labels = [index_df[col_name].tolist() for col_name in model.index]
+        df.index = pd.Index(labels[0] if len(labels) == 1 else list(zip(*labels)), name=model.name, tupleize_cols=False)
+        return df
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import typing as t
+import operator
+from functools import partial
+import pandas as pd
+import numpy as np
+
+from kye.vm.op import OP
+from kye.vm.column import Column, apply, logical
+from kye.errors.exceptions import KyeValueError
+
+if t.TYPE_CHECKING:
+    from kye.vm.vm import VM
+
+Kernel = t.Callable[..., Column]
+
+def load_column(vm: VM, col_name: str) -> Column:
+    return vm.get_column(col_name)
+
+def load_value(vm: VM, value: t.Any) -> Column:
+    return Column.constant(value, vm.df.index)
+
+def cast(vm: VM, col: Column, dtype: str) -> Column:
+    try:
+        return apply(_astype, col, dtype, selection=vm.selection)
+    except ValueError as e:
+        raise KyeValueError(f'Failed to cast column: {e}')
+
+def isnull(vm: VM, col: Column) -> Column:
+    return col.isnull()
+
+def notnull(vm: VM, col: Column) -> Column:
+    return col.notnull()
+
+def count(vm: VM, col: Column) -> Column:
+    col_series = col.to_series()
+    return Column.from_series(col_series.groupby(col_series.index).nunique())
+
+def elementwise(fn: t.Callable, vm: VM, *args: t.Any) -> Column:
+    return apply(fn, *args, selection=vm.selection)
+
+def boolean(ufunc: np.ufunc, fn: t.Callable, vm: VM, left: Column, right: t.Any) -> Column:
+    if is_dense([left, right], 'b'):
+        return run_ufunc(ufunc, left, right)
+    return logical(fn, left, right, selection=vm.selection)
+
+def dense(ufunc: np.ufunc, kinds: str, fn: t.Callable, vm: VM, *args: t.Any) -> Column:
+    """
+    Run a NumPy ufunc straight over the values when every column argument
+    has no nulls and shares the same index, skipping the null handling of
+    `apply`. Anything else goes through the pandas kernel `fn`.
+    """
+    if is_dense(args, kinds):
+        try:
+            return run_ufunc(ufunc, *args)
+        except (TypeError, OverflowError):
+            pass
+    return apply(fn, *args, selection=vm.selection)
+
+def is_dense(args: t.Sequence[t.Any], kinds: str) -> bool:
+    """ Whether the arguments are null-free arrays on one index, with dtypes of the given kinds """
+    index = None
+    for arg in args:
+        if isinstance(arg, Column):
+            if index is None:
+                index = arg.index
+            if arg.index is not index or arg.nulls is not None or arg.dictionary is not None:
+                return False
+            if arg.values.dtype.kind not in kinds:
+                return False
+        elif isinstance(arg, bool):
+            continue
+        elif kinds == 'b' or not isinstance(arg, (int, float)):
+            return False
+    return index is not None
+
+def run_ufunc(ufunc: np.ufunc, *args: t.Any) -> Column:
+    columns = [arg for arg in args if isinstance(arg, Column)]
+    dtypes = [arg.values.dtype if isinstance(arg, Column) else type(arg) for arg in args]
+    out_dtype = ufunc.resolve_dtypes((*dtypes, None))[-1]
+    # Write into an intermediate result that nothing else will read
+    out = None
+    for col in columns:
+        if col.temporary and col.values.dtype == out_dtype:
+            out = col.values
+            break
+    with np.errstate(all='ignore'):
+        values = ufunc(*(arg.values if isinstance(arg, Column) else arg for arg in args), out=out)
+    nulls = np.isnan(values) if values.dtype.kind == 'f' else None
+    result = Column(columns[0].index, values, nulls)
+    result.temporary = True
+    return result
+
+def _astype(col: pd.Series, dtype: str) -> pd.Series:
+    return col.astype(dtype)
+
+def _length(col: pd.Series) -> pd.Series:
+    return col.str.len()
+
+def _matches(col: pd.Series, pattern: str) -> pd.Series:
+    return col.str.contains(pattern, regex=True)
+
+def _isin(col: pd.Series, values: t.List[t.Any]) -> pd.Series:
+    return col.isin(values)
+
+def _notin(col: pd.Series, values: t.List[t.Any]) -> pd.Series:
+    return ~col.isin(values)
+
+def _between(col: pd.Series, lower: t.Any, upper: t.Any, inclusive: str) -> pd.Series:
+    return col.between(lower, upper, inclusive=inclusive) # type: ignore
+
+KERNELS: t.Dict[OP, Kernel] = {
+    OP.COL: load_column,
+    OP.VAL: load_value,
+    OP.CAST: cast,
+    OP.NA: isnull,
+    OP.DEF: notnull,
+    OP.NOT: partial(dense, np.invert, 'biu', operator.inv),
+    OP.NEG: partial(dense, np.negative, 'iuf', operator.neg),
+    OP.LEN: partial(elementwise, _length),
+    OP.NE: partial(dense, np.not_equal, 'biuf', operator.ne),
+    OP.EQ: partial(dense, np.equal, 'biuf', operator.eq),
+    OP.OR: partial(boolean, np.logical_or, operator.or_),
+    OP.AND: partial(boolean, np.logical_and, operator.and_),
+    OP.LT: partial(dense, np.less, 'biuf', operator.lt),
+    OP.GT: partial(dense, np.greater, 'biuf', operator.gt),
+    OP.LE: partial(dense, np.less_equal, 'biuf', operator.le),
+    OP.GE: partial(dense, np.greater_equal, 'biuf', operator.ge),
+    OP.ADD: partial(dense, np.add, 'iuf', operator.add),
+    OP.SUB: partial(dense, np.subtract, 'iuf', operator.sub),
+    OP.MUL: partial(dense, np.multiply, 'iuf', operator.mul),
+    OP.DIV: partial(dense, np.true_divide, 'iuf', operator.truediv),
+    OP.MOD: partial(elementwise, operator.mod),
+    OP.BETWEEN: partial(elementwise, _between),
+    OP.IN: partial(elementwise, _isin),
+    OP.NOT_IN: partial(elementwise, _notin),
+    OP.CONCAT: partial(elementwise, operator.add),
+    OP.MATCHES: partial(elementwise, _matches),
+    OP.COUNT: count,
+}
@@ -0,0 +1,79 @@
+"""
+Encode the rows of one or more columns into integer keys, so that
+composite indexes can be grouped and compared as plain int64 arrays.
+
+Each column is factorized into codes, and the codes are combined into
+a single key per row. Keys are numbered 0..n-1 in order of first
+appearance, and rows with a null in any of the columns get -1.
+"""
+from __future__ import annotations
+import typing as t
+import pandas as pd
+import numpy as np
+
+# Combined keys are re-factorized before they could overflow an int64
+MAX_KEY_SPACE = 2 ** 62
+
+def encode_keys(df: pd.DataFrame) -> np.ndarray:
+    """ Encode each row of the columns into an integer key """
+    return combine_codes([
+        pd.factorize(df[col_name])
+        for col_name in df.columns
+    ])
+
+def combine_codes(columns: t.Sequence[t.Tuple[np.ndarray, t.Sized]]) -> np.ndarray:
+    assert len(columns) > 0
+    codes, uniques = columns[0]
+    keys = np.asarray(codes, dtype=np.int64)
+    if len(columns) == 1:
+        return keys
+    size = len(uniques)
+    for codes, uniques in columns[1:]:
+        width = max(len(uniques), 1)
+        if size * width >= MAX_KEY_SPACE:
+            keys, size = compact(keys)
+        is_null = (keys < 0) | (codes < 0)
+        keys = keys * width + codes
+        keys[is_null] = -1
+        size *= width
+    return compact(keys)[0]
+
+def compact(keys: np.ndarray) -> t.Tuple[np.ndarray, int]:
+    """ Renumber the keys to 0..n-1, keeping -1 for null """
+    valid = keys >= 0
+    codes = np.full(len(keys), -1, dtype=np.int64)
+    codes[valid], uniques = pd.factorize(keys[valid])
+    return codes, len(uniques)
+
+def count_distinct(groups: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """ Count the distinct non-null values in each of the groups 0..n-1 """
+    num_groups = groups.max() + 1 if len(groups) else 0
+    valid = (groups >= 0) & (values >= 0)
+    if not valid.any():
+        return np.zeros(num_groups, dtype=np.int64)
+    width = values.max() + 1
+    pairs = pd.unique(groups[valid] * width + values[valid])
+    return np.bincount(pairs // width, minlength=num_groups)
+
+def hash_rows(df: pd.DataFrame) -> np.ndarray:
+    """
+    Hash each row's values, so that rows that would be given the same key
+    have the same hash, whichever dtype their columns were read as.
+    Factorizing counts 1 and 1.0 as the same value, so numbers are hashed
+    as floats, even in columns of objects.
+    """
+    return pd.util.hash_pandas_object(pd.DataFrame({
+        i: hash_values(df[col_name])
+        for i, col_name in enumerate(df.columns)
+    }), index=False).to_numpy()
+
+def hash_values(col: pd.Series) -> np.ndarray:
+    if col.dtype.kind in 'iufb':
+        return pd.util.hash_array(col.to_numpy(np.float64, na_value=np.nan))
+    hashes = pd.util.hash_array(col.to_numpy(object))
+    if pd.api.types.infer_dtype(col, skipna=True) in ('string', 'empty'):
+        return hashes
+    numbers = pd.to_numeric(col, errors='coerce').to_numpy(np.float64, na_value=np.nan)
+    is_number = ~np.isnan(numbers)
+    hashes[is_number] = pd.util.hash_array(numbers[is_number])
+    return hashes
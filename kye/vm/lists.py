@@ -0,0 +1,82 @@
+"""
+Columns of many-valued edges, held like an Arrow list array: one flat
+array with the values of every row, and the offset of each row's first
+value in it.
+
+An object column is flattened once per chunk, and then its type check,
+its assertions and the grouper all read the same flat values, instead of
+each exploding the lists again. Like `Series.explode`, a row that is not
+a list has its one value, and an empty list has a single null value, so
+every row has at least one value.
+"""
+from __future__ import annotations
+import typing as t
+import itertools
+
+import pandas as pd
+import numpy as np
+
+# What `pandas.api.types.infer_dtype` calls a column that could have lists in it
+MIXED_KINDS = ('mixed', 'mixed-integer')
+# The single null value that an empty list has
+EMPTY = (np.nan,)
+
+class ListArray(t.NamedTuple):
+    values: np.ndarray
+    offsets: np.ndarray
+
+    @staticmethod
+    def from_series(col: pd.Series) -> ListArray:
+        items = col.to_numpy()
+        if items.dtype != object or pd.api.types.infer_dtype(items, skipna=True) not in MIXED_KINDS:
+            # A column without any lists already has one value in each row
+            return ListArray(items, np.arange(len(items) + 1))
+        is_list = np.frompyfunc(pd.api.types.is_list_like, 1, 1)(items).astype(bool)
+        lengths = np.ones(len(items), dtype=np.int64)
+        lengths[is_list] = np.fromiter(map(len, items[is_list]), dtype=np.int64, count=int(is_list.sum()))
+        lengths = np.maximum(lengths, 1)
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # The values are copied straight into the flat array, which unlike
+        # `explode` doesn't build the whole result more than once
+        values = np.fromiter(itertools.chain.from_iterable(
+            (item if len(item) else EMPTY) if row_is_list else (item,)
+            for item, row_is_list in zip(items, is_list)
+        ), dtype=object, count=int(offsets[-1]))
+        return ListArray(values, offsets)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def is_flat(self) -> bool:
+        """ Whether every row has exactly one value """
+        return len(self.values) == len(self.offsets) - 1
+
+    def repeat(self, labels: t.Union[pd.Index, np.ndarray]) -> t.Union[pd.Index, np.ndarray]:
+        """ Repeat each row's label for each of its values """
+        return labels if self.is_flat else labels.repeat(self.lengths)
+
+    def to_series(self, index: t.Union[pd.Index, np.ndarray]) -> pd.Series:
+        """ The values, labelled with the rows they are from """
+        return pd.Series(self.values, index=self.repeat(index), dtype=self.values.dtype)
+
+    def take(self, mask: np.ndarray) -> ListArray:
+        """ The rows where `mask` is True """
+        if self.is_flat:
+            return ListArray(self.values[mask], np.arange(int(mask.sum()) + 1))
+        lengths = self.lengths[mask]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return ListArray(self.values[self.repeat(mask)], offsets)
+
+    def to_rows(self) -> np.ndarray:
+        """ An object column with the values of each row, and a row's only value as itself """
+        rows = np.empty(len(self.offsets) - 1, dtype=object)
+        if self.is_flat:
+            rows[:] = self.values
+            return rows
+        for i, (start, stop) in enumerate(zip(self.offsets[:-1], self.offsets[1:])):
+            rows[i] = self.values[start] if stop - start == 1 else self.values[start:stop]
+        return rows
@@ -1,52 +1,408 @@
 from __future__ import annotations
 import typing as t
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 import itertools
 
 import pandas as pd
+import numpy as np
 
 from kye.errors.validation_errors import ValidationErrorReporter
 from kye.errors.exceptions import KyeValueError
-from kye.vm.op import OP
 import kye.compiled as c
 from kye.vm.vm import VM
+from kye.vm.lists import ListArray
+from kye.vm.engine import Engine, PANDAS, get_engine
+from kye.vm.grouper import Grouper
+from kye.vm.spill import Partitions
+from kye.vm.scheduler import Scheduler, SERIAL, ProcessPool, SINGLE_PROCESS
+from kye.vm.table import Table
+from kye.vm.source import Source, FrameSource, DEFAULT_CHUNKSIZE
+from kye.vm.statistics import always_passes
 
-Expr = t.List[tuple[OP, list]]
+# Number of values looked at to find the type of a column of objects
+# before checking the whole column
+TYPE_SAMPLE_SIZE = 1000
+# Kinds of values that pandas.api.types.infer_dtype finds, that are
+# known to be read as the same type when every value is one of them.
+# Integers are left out, since ones too large for 64 bits are strings.
+INFERRED_TYPES = {
+    'string': 'String',
+    'bytes': 'String',
+    'empty': 'String',
+    'boolean': 'Boolean',
+    'floating': 'Number',
+    'mixed-integer-float': 'Number',
+}
 
-def hash_columns(df: pd.DataFrame) -> pd.Series:
-    if len(df.columns) == 1:
-        return df.iloc[:, 0]
-    return df.apply(tuple, axis=1)
+class Restart(Exception):
+    """
+    Raised when a chunk changes what is known about the source's columns
+    after earlier chunks were already loaded, so the load starts over
+    """
+
+@dataclass
+class TypeCheck:
+    """ The result of checking the type of a column in a chunk """
+    # The type the column was read as, or None if it had no values
+    read_type: t.Optional[c.Type] = None
+    # The type of the column, which is a string if it was read as another type before
+    col_type: t.Optional[c.Type] = None
+    # The column converted to its edge's type, if it needed converting,
+    # which for a column of lists is each of their values converted
+    values: t.Union[pd.Series, ListArray, None] = None
+    is_wrong_type: bool = False
+
+@dataclass
+class Columns:
+    """ What is known about the columns of a source, which is kept when a load restarts """
+    # Model columns, in the order they first appear
+    names: t.List[str] = field(default_factory=list)
+    extra: t.List[str] = field(default_factory=list)
+    # The type each column was read as, which all chunks must share
+    types: t.Dict[str, c.Type] = field(default_factory=dict)
+    wrong_types: t.Set[str] = field(default_factory=set)
+
+@dataclass
+class Scan:
+    """ What checking each chunk of a source found, for the checks that need all of its rows """
+    grouper: Grouper
+    num_rows: int = 0
+    # The numbers of the first row and the row after the last, which
+    # are the source's own row labels after the offset
+    row_range: t.Optional[t.Tuple[int, int]] = None
+    # Rows that failed each single-column assertion, in each chunk
+    failures: t.Dict[int, t.List[pd.Index]] = field(default_factory=dict)
+    # When the errors are written to sinks, the failed rows of each
+    # assertion are written to disk instead, in the partition of its number
+    failure_log: t.Optional[Partitions] = None
+    had_dropped_rows: bool = False
+    is_wrong_index_type: bool = False
+
+    def shift(self, num_rows: int):
+        """ Number the rows after `num_rows` rows of the source that were scanned apart from them """
+        self.grouper.shift(num_rows)
+        self.failures = {
+            i: [rows + num_rows for rows in failed_rows]
+            for i, failed_rows in self.failures.items()
+        }
+        if self.row_range is not None:
+            self.row_range = (self.row_range[0] + num_rows, self.row_range[1] + num_rows)
+
+    def extend(self, other: Scan):
+        """ Add what the scan of the rows after these found """
+        self.grouper.extend(other.grouper)
+        self.num_rows += other.num_rows
+        if other.row_range is not None:
+            self.row_range = other.row_range if self.row_range is None else (
+                min(self.row_range[0], other.row_range[0]),
+                max(self.row_range[1], other.row_range[1]),
+            )
+        for i, failed_rows in other.failures.items():
+            self.failures.setdefault(i, []).extend(failed_rows)
+        self.had_dropped_rows |= other.had_dropped_rows
+        self.is_wrong_index_type |= other.is_wrong_index_type
+
+def agrees_with(columns: Columns, merged: Columns) -> bool:
+    """
+    Whether a piece found what all of the pieces found, so that it was
+    read the same as if the source had been read whole. A column it had
+    no values of only matters if the column is read as strings.
+    """
+    return (
+        columns.names == merged.names
+        and columns.wrong_types == merged.wrong_types
+        and all(
+            columns.types[col_name].name == col_type.name
+            if col_name in columns.types else col_type.name != 'String'
+            for col_name, col_type in merged.types.items()
+        )
+    )
 
 class Loader:
     reporter: ValidationErrorReporter
-    tables: t.Dict[str, pd.DataFrame]
+    tables: t.Dict[str, Table]
     compiled: c.Compiled
+    engine: Engine
+    # Bytes the checks across a whole table can use before spilling to disk
+    memory_budget: t.Optional[int]
+    scheduler: Scheduler
+    # Processes that sources read from files are split between
+    pool: ProcessPool
     
-    def __init__(self, compiled: c.Compiled, reporter: ValidationErrorReporter):
+    def __init__(self, compiled: c.Compiled, reporter: ValidationErrorReporter, engine: Engine = PANDAS, memory_budget: t.Optional[int] = None, scheduler: Scheduler = SERIAL, pool: ProcessPool = SINGLE_PROCESS):
         self.reporter = reporter
+        self.engine = engine
+        self.memory_budget = memory_budget
+        self.scheduler = scheduler
+        self.pool = pool
         self.tables = {}
         self.compiled = c.native_types() | compiled
     
     def load(self, source_name: str, df: pd.DataFrame):
-        if source_name in self.tables:
-            raise NotImplementedError(f"Table '{source_name}' already loaded. Multiple sources for table not yet supported.")
-        
-        # Check the table's index
-        if not isinstance(df.index, pd.RangeIndex):
-            assert None not in df.index.names, "Table should have a range index or a named index"
-            df.reset_index(inplace=True)
-        assert df.index.is_unique, "Table index must be unique at this point"
-        df.index.name = source_name
+        self.load_source(source_name, FrameSource(df))
 
+    def load_source(self, source_name: str, source: Source):
+        """
+        Load a source into a model's table. When the table was already
+        loaded, the source's rows are numbered after the last row before
+        it and its groups are merged into the table.
+        """
         # Check if is a known model
         assert source_name in self.compiled.models, f"Source '{source_name}' not found"
         model = self.compiled.models[source_name]
-        
-        # Conform the table columns to our model edges
-        #   - rename columns that use titles
-        #   - drop any extra columns
+        table = self.tables.setdefault(source_name, Table(model))
+
+        columns = Columns()
+        while True:
+            try:
+                df, scan = self.read_source(model, source, columns, table)
+                break
+            except Restart:
+                continue
+        self.use_source(model, source, columns, table.next_row, scan.row_range)
+        if scan.row_range is not None:
+            # A frame's rows are numbered by its labels, which need not start from zero
+            table.next_row = max(table.next_row, scan.row_range[1])
+        if df is not None:
+            table.merge(df)
+
+    def read_source(self, model: c.Model, source: Source, columns: Columns, table: Table) -> t.Tuple[t.Optional[pd.DataFrame], Scan]:
+        """
+        Check each chunk of the source's rows, and then the checks that
+        need all of the rows. Errors are only reported once every chunk
+        has been read, since a restart discards them and a later chunk
+        can still change the type of a column.
+        Returns the checked groups and what the scan of the rows found.
+        """
+        pieces = source.split(self.pool.processes) if self.pool.processes > 1 else [source]
+        if len(pieces) > 1:
+            scan = self.scan_pieces(model, pieces, columns, table.next_row)
+        else:
+            scan = self.scan_source(model, source, columns, table.next_row)
+        try:
+            return self.check_scan(model, scan, columns, table), scan
+        finally:
+            if scan.failure_log is not None:
+                scan.failure_log.close()
+
+    def scan_source(self, model: c.Model, source: Source, columns: Columns, offset: int = 0, chunksize: t.Optional[int] = None) -> Scan:
+        """
+        Check the types and single-column assertions of each chunk, and
+        group its rows. When the errors are written to sinks, the failed
+        rows are kept on disk rather than in memory until they are reported.
+        """
+        scan = Scan(Grouper(model, self.memory_budget, self.scheduler))
+        if len(self.reporter.sinks):
+            scan.failure_log = Partitions(len(model.assertions))
+        is_first = True
+        for chunk in source.chunks(self.column_dtypes(model, columns), chunksize, self.column_filter(model, columns)):
+            scan.num_rows += len(chunk)
+            # The chunk's rows in the source, for looking up their statistics
+            rows = (chunk.index[0], chunk.index[-1] + 1) if len(chunk) else None
+            df = self.conform_columns(model, chunk, columns, is_first)
+            if offset:
+                df.index = df.index + offset
+            if len(df):
+                first_row, stop_row = int(df.index.min()), int(df.index.max()) + 1
+                if scan.row_range is not None:
+                    first_row, stop_row = min(first_row, scan.row_range[0]), max(stop_row, scan.row_range[1])
+                scan.row_range = (first_row, stop_row)
+            is_first_chunk, is_first = is_first, False
+
+            # Check that the table has all the required columns
+            if any(col_name not in df.columns for col_name in model.index):
+                if source.uniform_columns:
+                    break
+                # A later chunk might still have them
+                continue
+
+            # Check the type of each column. The columns are read and cast
+            # independently, and then the results are used in column order
+            checked_columns = [col_name for col_name in df.columns if col_name not in columns.wrong_types]
+            # Columns flattened by the type checks are reused by the assertions and the grouper
+            lists: t.Dict[str, ListArray] = {}
+            type_checks = dict(zip(checked_columns, self.scheduler.map(
+                lambda col_name: self.check_type(model[col_name], df, columns.types.get(col_name), lists=lists),
+                checked_columns,
+            )))
+            drop_columns = []
+            for col_name in df.columns:
+                if col_name in columns.wrong_types:
+                    drop_columns.append(col_name)
+                    scan.is_wrong_index_type |= col_name in model.index
+                    continue
+                # Earlier chunks only need to be loaded again if they used the column
+                has_loaded_rows = not is_first_chunk and not scan.is_wrong_index_type
+                values = type_checks[col_name].values
+                if isinstance(values, ListArray):
+                    lists[col_name] = values
+                elif values is not None:
+                    lists.pop(col_name, None)
+                if not self.use_type_check(col_name, type_checks[col_name], df, columns, has_loaded_rows):
+                    drop_columns.append(col_name)
+                    if col_name in model.index:
+                        scan.is_wrong_index_type = True
+                    elif has_loaded_rows:
+                        raise Restart()
+            if scan.is_wrong_index_type:
+                # Keep reading to find the type of every other column
+                continue
+            if len(drop_columns):
+                df.drop(columns=drop_columns, inplace=True)
+
+            # Run the single-column assertions, with the assertions of each column run together
+            assertions_by_column: t.Dict[str, t.List[t.Tuple[int, c.Assertion]]] = {}
+            for i, assertion in enumerate(model.assertions):
+                if len(assertion.edges) == 1 and assertion.edges[0] in df.columns:
+                    if self.is_proven(model, source, assertion, type_checks[assertion.edges[0]], rows):
+                        continue
+                    assertions_by_column.setdefault(assertion.edges[0], []).append((i, assertion))
+            results = self.scheduler.map(
+                lambda assertions: self.run_assertions(df, assertions, lists),
+                assertions_by_column.values(),
+            )
+            mask = np.ones(len(df), dtype=bool)
+            for i, failed, failed_rows in sorted(itertools.chain.from_iterable(results), key=lambda result: result[0]):
+                mask &= ~failed
+                if scan.failure_log is None:
+                    scan.failures.setdefault(i, []).append(failed_rows)
+                else:
+                    scan.failure_log.append(i, pd.DataFrame({'row': failed_rows.to_numpy()}))
+            scan.had_dropped_rows |= not mask.all()
+            scan.grouper.add(df, None if mask.all() else mask, lists)
+        return scan
+
+    def is_proven(self, model: c.Model, source: Source, assertion: c.Assertion, type_check: TypeCheck, rows: t.Optional[t.Tuple[int, int]]) -> bool:
+        """
+        Whether the source's statistics show that every row of the chunk
+        passes a single-column assertion, so it doesn't need to be run
+        """
+        # Statistics are of the values as stored, so they can't be used once the values are cast
+        if rows is None or type_check.values is not None:
+            return False
+        edge = model[assertion.edges[0]]
+        stats = source.statistics(edge.title or edge.name, *rows)
+        return stats is not None and always_passes(assertion.expr, stats)
+
+    def scan_pieces(self, model: c.Model, pieces: t.List[Source], columns: Columns, offset: int = 0) -> Scan:
+        """
+        Scan each piece of a source in a worker process, and join what
+        they found in the order of the pieces. Every piece must be read
+        with the columns and types of the whole source, so a piece that
+        found less than the others is scanned again with what they all
+        found, until every piece agrees.
+        """
+        settings = (self.compiled, self.engine.name, self.memory_budget)
+        results: t.List[t.Tuple[Columns, Scan]] = []
+        to_scan = list(range(len(pieces)))
+        while len(to_scan):
+            scanned = self.pool.map(scan_piece, [
+                (settings, model.name, pieces[i], offset, columns)
+                for i in to_scan
+            ])
+            if len(results) == 0:
+                results = list(scanned)
+            else:
+                for i, result in zip(to_scan, scanned):
+                    results[i] = result
+            merged = self.merge_columns([found for found, _ in results])
+            columns.names[:] = merged.names
+            columns.extra[:] = merged.extra
+            columns.types.update(merged.types)
+            columns.wrong_types.update(merged.wrong_types)
+            to_scan = [i for i, (found, _) in enumerate(results) if not agrees_with(found, columns)]
+
+        scan = None
+        num_rows = 0
+        for piece, (_, piece_scan) in zip(pieces, results):
+            if piece.renumbered:
+                piece_scan.shift(num_rows)
+            num_rows += piece_scan.num_rows
+            if scan is None:
+                scan = piece_scan
+                scan.grouper.scheduler = self.scheduler
+            else:
+                scan.extend(piece_scan)
+        assert scan is not None
+        return scan
+
+    def merge_columns(self, found: t.Sequence[Columns]) -> Columns:
+        """
+        What is known about the columns of a source from what each of its
+        pieces found, as if it had been read whole. A column that the
+        pieces read as different types is a string column.
+        """
+        merged = Columns()
+        for columns in found:
+            merged.names.extend(col_name for col_name in columns.names if col_name not in merged.names)
+            merged.extra.extend(col_name for col_name in columns.extra if col_name not in merged.extra)
+            for col_name, col_type in columns.types.items():
+                known_type = merged.types.setdefault(col_name, col_type)
+                if known_type.name != col_type.name:
+                    merged.types[col_name] = self.compiled.types['String']
+            merged.wrong_types.update(columns.wrong_types)
+        return merged
+
+    def check_scan(self, model: c.Model, scan: Scan, columns: Columns, table: Table) -> t.Optional[pd.DataFrame]:
+        """ Report what the chunks failed, and run the checks that need all of the rows """
+        grouper = scan.grouper
+        num_rows = scan.num_rows
+        is_wrong_index_type = scan.is_wrong_index_type
+        if len(columns.extra):
+            print(f"Warning: Table '{model.name}' had extra columns: {','.join(columns.extra)}")
+            if len(columns.names) == 0 or num_rows == 0:
+                return None
+
+        is_missing_index_column = False
+        for col_name in model.index:
+            if col_name not in columns.names:
+                is_missing_index_column = True
+                self.reporter.missing_index(model[col_name])
+        if is_missing_index_column:
+            return None
+
+        # Columns that were null in every chunk are still checked, like a whole column of nulls
+        untyped_columns = [
+            col_name for col_name in grouper.columns
+            if col_name not in columns.types and num_rows > 0
+        ]
+        for col_name in untyped_columns:
+            col = pd.DataFrame({col_name: pd.Series([None], dtype=grouper.dtype(col_name))})
+            type_check = self.check_type(model[col_name], col, None, check_nulls=True)
+            if not self.use_type_check(col_name, type_check, col, columns, False):
+                grouper.drop_column(col_name)
+                is_wrong_index_type |= col_name in model.index
+
+        for col_name in columns.names:
+            if col_name in columns.wrong_types:
+                self.reporter.wrong_type(model[col_name])
+        if is_wrong_index_type:
+            return None
+
+        for i, assertion in enumerate(model.assertions):
+            if i in scan.failures:
+                self.reporter.assertion_failed(assertion, np.concatenate([rows.to_numpy() for rows in scan.failures[i]]))
+            elif scan.failure_log is not None:
+                # Each chunk's rows are written to the sinks as they are read back
+                error = None
+                for failed in scan.failure_log.frames(i):
+                    if error is None:
+                        error = self.reporter.assertion_failed(assertion, failed['row'].to_numpy())
+                    else:
+                        self.reporter.add_rows(error, failed['row'].to_numpy())
+        if scan.had_dropped_rows and len(grouper.rows) == 0:
+            return None
+
+        return grouper.finish(self.reporter, table)
+
+    def conform_columns(self, model: c.Model, df: pd.DataFrame, columns: Columns, is_first_chunk: bool) -> pd.DataFrame:
+        """
+        Conform the chunk's columns to our model edges
+          - rename columns that use titles
+          - drop any extra columns
+          - add any columns that other chunks have as nulls
+        """
         col_name_map = {
             edge.title or edge.name: edge.name
             for edge in model.edges.values()
@@ -56,159 +412,245 @@ class Loader:
         for col_name in df.columns:
             if col_name not in col_name_map:
                 drop_columns.append(col_name)
-            elif col_name != col_name_map[col_name]:
+                if col_name not in columns.extra:
+                    columns.extra.append(col_name)
+                continue
+            if col_name != col_name_map[col_name]:
                 rename_map[col_name] = col_name_map[col_name]
+            if col_name_map[col_name] not in columns.names:
+                columns.names.append(col_name_map[col_name])
+                if not is_first_chunk:
+                    # The earlier chunks were loaded without this column
+                    raise Restart()
         if len(drop_columns):
-            print(f"Warning: Table '{model.name}' had extra columns: {','.join(drop_columns)}")
-            df.drop(columns=drop_columns, inplace=True)
-            if df.empty:
-                return None
+            df = df.drop(columns=drop_columns)
         if len(rename_map):
-            df.rename(columns=rename_map, inplace=True)
-        
-        self.reporter.use_source(df.copy())
-        vm = VM(df)
+            df = df.rename(columns=rename_map)
+        if df.columns.tolist() != columns.names:
+            df = df.reindex(columns=columns.names)
+        else:
+            # Columns are replaced when cast, which must not change the source
+            df = df.copy(deep=False)
+        df.index.name = model.name
+        return df
 
-        # Check that the table has all the required columns
-        is_missing_index_column = False
-        for col_name in model.index:
-            if col_name not in df.columns:
-                is_missing_index_column = True
-                self.reporter.missing_index(model[col_name])
-        if is_missing_index_column:
-            return None
+    def column_filter(self, model: c.Model, columns: t.Optional[Columns] = None) -> t.Callable[[str], bool]:
+        """
+        Which of a source's columns to read. Columns that are not in the
+        model are recorded as extra instead. The first column is always
+        read, so the rows are still counted when no other column is used.
+        """
+        col_names = set(edge.title or edge.name for edge in model.edges.values())
+        first_col_name = None
 
-        # Check the type of each column
-        drop_columns = []
-        for col_name in df.columns:
-            edge = model[col_name]
-            col = df[col_name]
-            col_type = self.get_column_type(col)
-            if col_type is None:
-                continue # Column is empty, nothing to check
-            elif col_type.name == edge.type:
-                continue # Column is the correct type
-            elif edge.type not in self.compiled.types:
-                # TODO: resolve non-native types
-                raise NotImplementedError(f"Unknown type '{edge.type}'")
-            elif edge.type in col_type:
-                # Attempt an implicit conversion
-                cast_fn = col_type[edge.type].expr
-                assert cast_fn is not None
-                try:
-                    df[col_name] = vm.eval([
-                        c.Cmd(OP.COL, [col_name]),
-                        *cast_fn,
-                    ])
-                    continue
-                except KyeValueError as e:
-                    pass
-            # If we reach this point, the column is the wrong type
-            if col_name in model.index:
-                is_missing_index_column = True
-            drop_columns.append(col_name)
-            self.reporter.wrong_type(edge)
-        if is_missing_index_column:
-            return None
-        if len(drop_columns):
-            df.drop(columns=drop_columns, inplace=True)
-            if df.empty:
-                return None
+        def use_column(col_name: str) -> bool:
+            nonlocal first_col_name
+            if first_col_name is None:
+                first_col_name = col_name
+            if col_name in col_names:
+                return True
+            if columns is not None and col_name not in columns.extra:
+                columns.extra.append(col_name)
+            return col_name == first_col_name
+        return use_column
 
-        # Run the single-column assertions
-        mask = pd.Series(True, index=df.index)
-        for assertion in model.assertions:
-            if len(assertion.edges) == 1 and assertion.edges[0] in df.columns:
-                result = vm.eval(assertion.expr)
-                if not result.all():
-                    mask &= result
-                    self.reporter.assertion_failed(assertion, result[~result].index.tolist())
-        if not mask.all():
-            df.drop(df[~mask].index, inplace=True)
-            if df.empty:
-                return None
-        
-        # Check that sub-indexes are unique to each other
-        if len(model.indexes) > 1:
-            mask = pd.Series(True, index=df.index)
-            idx = hash_columns(df[model.index])
-            for sub_idx_edges in model.indexes:
-                sub_idx = hash_columns(df[sub_idx_edges])
-                invalid = idx.groupby(sub_idx).nunique() != 1
-                if invalid.any():
-                    invalid_rows = pd.Series(df.index, index=sub_idx)[invalid]
-                    mask.loc[invalid_rows] = False # type: ignore
-                    self.reporter.non_unique_sub_index(model, sub_idx_edges, invalid_rows.tolist())
-            if not mask.all():
-                df.drop(df[~mask].index, inplace=True)
-                if df.empty:
-                    return None
-                
-
-        # Run cardinality assertions and groupby the index
-        idx = hash_columns(df[model.index]).rename(model.name)
-        reversed_idx = pd.Series(df.index, index=idx)
-        grouped_df = pd.DataFrame(index=idx.drop_duplicates())
-        df.set_index(idx, inplace=True)
-        mask = pd.Series(True, index=grouped_df.index)
-        for col_name in df.columns:
-            col = df[col_name]
-            edge = model[col_name]
-            g = col.explode().dropna().groupby(level=0)
-            if not edge.many or not edge.none:
-                nunique = g.nunique().reindex(grouped_df.index, fill_value=0)
-                if not edge.many:
-                    has_many = nunique > 1
-                    if has_many.any():
-                        mask &= ~has_many
-                        self.reporter.multiple_values(model[col_name], reversed_idx.loc[has_many].tolist())
-                if not edge.none:
-                    is_null = nunique == 0
-                    if is_null.any():
-                        mask &= ~is_null
-                        self.reporter.missing_values(model[col_name], reversed_idx.loc[is_null].tolist())
-            grouped_df[col_name] = g.agg('unique' if edge.many else 'first')
-        df = grouped_df
-        if not mask.all():
-            df.drop(df[~mask].index, inplace=True)
-            if df.empty:
-                return None
-        
-        # Check for index conflicts
-        if len(model.indexes) > 1:
-            mask = pd.Series(True, index=df.index)
-            for idx1_id, idx2_id in itertools.combinations(range(len(model.indexes)), 2):
-                idx1 = model.indexes[idx1_id]
-                idx2 = model.indexes[idx2_id]
-                # TODO: Check if compatible index types
-                if len(idx1) != len(idx2):
+    def column_dtypes(self, model: c.Model, columns: Columns) -> t.Dict[str, t.Any]:
+        """
+        String edges are read as strings, rather than parsed as numbers
+        and then cast back. Columns that mix types across chunks are read
+        as strings too, like they would be if the whole source was read at once.
+        """
+        dtypes = {
+            edge.title or edge.name: object
+            for edge in model.edges.values()
+            if edge.type == 'String'
+        }
+        dtypes.update({
+            model[col_name].title or col_name: object
+            for col_name, col_type in columns.types.items()
+            if col_type.name == 'String'
+        })
+        return dtypes
+
+    def check_type(self, edge: c.Edge, df: pd.DataFrame, known_type: t.Optional[c.Type], check_nulls: bool = False, lists: t.Optional[t.Dict[str, ListArray]] = None) -> TypeCheck:
+        """
+        Check the type of a column in the chunk, converting it to the
+        edge's type if needed. Only reads the chunk, so that the columns
+        can be checked at the same time. Columns flattened along the way
+        are kept in `lists` for the chunk's other VMs.
+        """
+        col_name = edge.name
+        col = df[col_name]
+        if not check_nulls and col.isna().all():
+            return TypeCheck() # Column has no values in this chunk, nothing to check
+        read_type = self.get_column_type(col, lists)
+        if read_type is None:
+            return TypeCheck() # Column is empty, nothing to check
+        col_type = read_type
+        if known_type is not None and known_type.name != col_type.name:
+            # A column read as more than one type holds strings when read as a whole
+            col_type = self.compiled.types['String']
+        if col_type.name == edge.type:
+            return TypeCheck(read_type, col_type) # Column is the correct type
+        elif edge.type not in self.compiled.types:
+            # TODO: resolve non-native types
+            raise NotImplementedError(f"Unknown type '{edge.type}'")
+        elif edge.type in col_type:
+            # Attempt an implicit conversion
+            cast_fn = col_type[edge.type].program
+            assert cast_fn is not None
+            vm = VM(df, self.engine, lists)
+            try:
+                col_lists = vm.get_lists(col_name) if col.dtype == 'object' else None
+                if col_lists is not None and not col_lists.is_flat:
+                    # Each value of the lists is converted on its own
+                    values_vm = VM(pd.DataFrame({col_name: col_lists.values}), self.engine)
+                    values = values_vm.eval(cast_fn, values_vm.get_column(col_name))
+                    values = values.reindex(pd.RangeIndex(len(col_lists.values))).to_numpy()
+                    return TypeCheck(read_type, col_type, values=ListArray(values, col_lists.offsets))
+                return TypeCheck(read_type, col_type, values=vm.eval(cast_fn, vm.get_column(col_name)))
+            except KyeValueError as e:
+                pass
+        # If we reach this point, the column is the wrong type
+        return TypeCheck(read_type, col_type, is_wrong_type=True)
+
+    def use_type_check(self, col_name: str, type_check: TypeCheck, df: pd.DataFrame, columns: Columns, has_loaded_rows: bool) -> bool:
+        """
+        Record the type a column was read as, and replace it with its
+        converted values. Returns False if the column is the wrong type.
+        """
+        if type_check.read_type is None:
+            return True
+        known_type = columns.types.setdefault(col_name, type_check.read_type)
+        if known_type.name != type_check.col_type.name:
+            columns.types[col_name] = type_check.col_type
+            if has_loaded_rows:
+                raise Restart()
+        if type_check.is_wrong_type:
+            columns.wrong_types.add(col_name)
+            return False
+        if isinstance(type_check.values, ListArray):
+            df[col_name] = type_check.values.to_rows()
+        elif type_check.values is not None:
+            df[col_name] = type_check.values
+        return True
+
+    def run_assertions(self, df: pd.DataFrame, assertions: t.List[t.Tuple[int, c.Assertion]], lists: t.Optional[t.Dict[str, ListArray]] = None) -> t.List[t.Tuple[int, np.ndarray, pd.Index]]:
+        """
+        Run single-column assertions on the chunk, returning the mask of
+        the rows that failed each assertion and their row ids
+        """
+        vm = VM(df, self.engine, lists)
+        vm.plan(assertion.program for _, assertion in assertions)
+        results = []
+        for i, assertion in assertions:
+            result = assertion.program(vm)
+            if result.values.dtype == bool:
+                failed = ~result.values if result.nulls is None else ~(result.values | result.nulls)
+                if not failed.any():
                     continue
+                if result.index is df.index:
+                    # Dense results line up with the table's rows,
+                    # so row ids are only looked up for the failures
+                    results.append((i, failed, df.index[failed]))
+                else:
+                    # Many-valued results have a value for each of a row's values
+                    failed_rows = result.index[failed].unique()
+                    results.append((i, df.index.isin(failed_rows), failed_rows))
+                continue
+            result = result.to_series()
+            if not result.all():
+                failed_rows = result[~result].index.unique()
+                results.append((i, df.index.isin(failed_rows), failed_rows))
+        return results
+
+    def use_source(self, model: c.Model, source: Source, columns: Columns, offset: int = 0, row_range: t.Optional[t.Tuple[int, int]] = None):
+        """
+        Give the reporter a way to read the source rows that it will show
+        with the errors. They are only read if the errors are printed.
+        """
+        if not any(err.model == model.name for err in self.reporter.errors):
+            return
+        first_row, stop_row = row_range or (offset, offset)
+        dtype = self.column_dtypes(model, columns)
 
-                t = pd.concat([
-                    hash_columns(df[idx1]),
-                    hash_columns(df[idx2]),
-                ])
-                t = pd.Series(t.index, index=t) # flip index/value
-                invalid = t[t.groupby(level=0).nunique() > 1]
-                if not invalid.empty:
-                    mask.loc[invalid] = False
-                    invalid_rows = reversed_idx.loc[invalid].tolist()
-                    self.reporter.index_conflict(model, list(set(idx1) | set(idx2)), invalid_rows)
-            if not mask.all():
-                df.drop(df[~mask].index, inplace=True)
-                if df.empty:
-                    return None
-        
-        self.tables[source_name] = df
+        def read_rows(rows: t.Iterable[int]) -> pd.DataFrame:
+            # Rows outside of the source's rows are from the table's other sources
+            rows = set(row for row in rows if first_row <= row < stop_row)
+            num_head_rows = self.reporter.ROW_COUNT
+            parts = []
+            # Only read as far as the last row that will be shown
+            for chunk in source.chunks(dtype, DEFAULT_CHUNKSIZE, self.column_filter(model)):
+                index = chunk.index + offset
+                # The first rows are shown for errors that are not about specific rows
+                is_shown = np.arange(len(chunk)) < num_head_rows
+                is_shown |= index.isin(rows)
+                parts.append(chunk[is_shown].set_axis(index[is_shown]))
+                rows.difference_update(index)
+                num_head_rows -= len(chunk)
+                if len(rows) == 0 and num_head_rows <= 0:
+                    break
+            return self.conform_columns(model, pd.concat(parts), Columns(), True)
+
+        self.reporter.use_source(model.name, read_rows)
     
-    def get_column_type(self, col: pd.Series) -> t.Optional[c.Type]:
-        dtype = col.explode().dropna().infer_objects().dtype
+    def get_column_type(self, col: pd.Series, lists: t.Optional[t.Dict[str, ListArray]] = None) -> t.Optional[c.Type]:
+        """
+        Find the type a column was read as. A column of objects is first
+        guessed from a sample of its values, which settles it when one of
+        them is a string. Otherwise the whole column is checked in one pass,
+        and only a column with lists or unusual values is flattened to see
+        the type its values have together.
+        """
         if col.empty:
             return None
+        dtype = col.dtype
+        if dtype == 'object':
+            kind = pd.api.types.infer_dtype(col.iloc[:TYPE_SAMPLE_SIZE], skipna=True)
+            if INFERRED_TYPES.get(kind) != 'String' or kind == 'empty':
+                kind = pd.api.types.infer_dtype(col, skipna=True)
+            if kind in INFERRED_TYPES:
+                return self.compiled.types[INFERRED_TYPES[kind]]
+            col_lists = ListArray.from_series(col)
+            if lists is not None:
+                lists[col.name] = col_lists
+            values = pd.Series(col_lists.values, dtype=col_lists.values.dtype)
+            kind = pd.api.types.infer_dtype(values, skipna=True)
+            if kind in INFERRED_TYPES:
+                return self.compiled.types[INFERRED_TYPES[kind]]
+            dtype = values.dropna().infer_objects().dtype
         if pd.api.types.is_bool_dtype(dtype):
             return self.compiled.types['Boolean']
         if pd.api.types.is_numeric_dtype(dtype):
             return self.compiled.types['Number']
         if col.dtype == 'object':
             return self.compiled.types['String']
-        raise Exception(f"Unknown type {dtype}")
\ No newline at end of file
+        raise Exception(f"Unknown type {dtype}")
+
+# The loader of a worker process, built once when the process starts
+# The models, engine and memory budget of the loader that sent the last
+# piece to this worker process, and the loader that scans its pieces
+Settings = t.Tuple[c.Compiled, str, t.Optional[int]]
+worker_settings: t.Optional[Settings] = None
+worker_loader: t.Optional[Loader] = None
+
+def scan_piece(args: t.Tuple[Settings, str, Source, int, Columns]) -> t.Tuple[Columns, Scan]:
+    """ Scan one piece of a source in a worker process, starting from what is known about its columns """
+    global worker_settings, worker_loader
+    settings, model_name, source, offset, columns = args
+    # The pool is shared by every loader, so a worker's loader is only
+    # kept while it is sent pieces for the same models
+    if worker_loader is None or worker_settings != settings:
+        compiled, engine, memory_budget = settings
+        worker_loader = Loader(compiled, ValidationErrorReporter(), get_engine(engine), memory_budget)
+        worker_settings = settings
+    model = worker_loader.compiled.models[model_name]
+    while True:
+        try:
+            scan = worker_loader.scan_source(model, source, columns, offset, source.chunksize or DEFAULT_CHUNKSIZE)
+            break
+        except Restart:
+            continue
+    # Merge the groups of the piece's chunks before sending them back
+    scan.grouper.compact()
+    return columns, scan
@@ -32,6 +32,10 @@ class OP(Enum):
     DIV =        auto(), 2, 'num'
     MOD =        auto(), 2, 'num'
     
+    BETWEEN =    auto(), 4, 'any', 'any', 'str' # lower bound, upper bound, inclusive
+    IN =         auto(), 2, 'list' # set membership
+    NOT_IN =     auto(), 2, 'list'
+
     # string functions
     MATCHES =    auto(), 2, 'str'
     CONCAT =     auto(), 2, 'str'
@@ -50,6 +54,15 @@ class OP(Enum):
     @property
     def signature(self):
         return self.value[2:]
+
+    @property
+    def preserves_nulls(self) -> bool:
+        """ Whether the operation never produces a null from non-null operands """
+        return self in (
+            OP.COL, OP.VAL, OP.NOT, OP.NEG,
+            OP.EQ, OP.NE, OP.LT, OP.GT, OP.LE, OP.GE,
+            OP.AND, OP.OR, OP.BETWEEN, OP.IN, OP.NOT_IN,
+        )
     
     def matches_signature(self, args):
         if len(args) > len(self.signature):
@@ -67,6 +80,9 @@ class OP(Enum):
             elif sig_arg == 'str':
                 if not isinstance(arg, str):
                     return False
+            elif sig_arg == 'list':
+                if not isinstance(arg, list) or not all(isinstance(item, (int, float, str)) for item in arg):
+                    return False
             else:
                 raise ValueError(f'Invalid signature: {sig_arg}')
         return True
@@ -81,6 +97,9 @@ def parse_command(cmd: t.Any) -> tuple[OP, list]:
         cmd, args = list(cmd.items())[0]
         assert isinstance(cmd, str)
         op = OP[cmd.upper()]
+        # A single list argument is written without the enclosing list
+        if op.signature[:1] == ('list',) and isinstance(args, list) and not any(isinstance(arg, list) for arg in args):
+            args = [args]
         if not isinstance(args, list):
             if args is None:
                 args = []
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import typing as t
+from dataclasses import dataclass
+
+from functools import cached_property
+
+from kye.vm.op import OP
+from kye.vm.column import Column, Selection
+
+if t.TYPE_CHECKING:
+    from kye.compiled import Expr
+    from kye.vm.vm import VM
+
+def literal_key(value: t.Any) -> t.Hashable:
+    # Include the type so that literals like `1` and `True` are not confused
+    if isinstance(value, (list, tuple)):
+        return tuple(literal_key(item) for item in value)
+    return (type(value).__name__, value)
+
+@dataclass(frozen=True, eq=False)
+class Node:
+    """
+    A command with its stack arguments resolved to the nodes that produce
+    them. The kernel that runs it is looked up from the VM's engine.
+
+    Structurally identical nodes share the same `key`, which lets the VM
+    compute a sub-expression once no matter how many expressions use it.
+    Nodes that depend on the program's inputs have no key.
+    """
+    op: OP
+    inputs: t.Tuple[t.Union[Node, Input], ...]
+    args: t.Tuple[t.Any, ...]
+    key: t.Optional[t.Hashable]
+
+    def eval(self, vm: VM, inputs: t.Sequence[Column]) -> Column:
+        args = []
+        for node in self.inputs:
+            args.append(vm.run(node, inputs))
+        return vm.engine.kernels[self.op](vm, *args, *self.args)
+
+@dataclass(frozen=True, eq=False)
+class LogicalNode(Node):
+    """
+    An AND or OR that only computes its right side for the rows
+    that its left side did not already decide.
+    """
+
+    @cached_property
+    def short_circuit(self) -> bool:
+        # Skipping rows is only safe when both sides are null on the same rows,
+        # because a row that is null on only one side evaluates to False
+        if len(self.inputs) != 2:
+            return False
+        left, right = (null_columns(node) for node in self.inputs)
+        return left is not None and left == right
+
+    def eval(self, vm: VM, inputs: t.Sequence[Column]) -> Column:
+        if not self.short_circuit:
+            return super().eval(vm, inputs)
+        kernel = vm.engine.kernels[self.op]
+        left_node, right_node = self.inputs
+        left = vm.run(left_node, inputs)
+        if left.dictionary is not None or left.values.dtype != bool:
+            return kernel(vm, left, vm.run(right_node, inputs))
+        # AND is decided where the left is False, OR where it is True
+        undecided = left.values if self.op == OP.AND else ~left.values
+        if left.nulls is not None:
+            undecided = undecided & ~left.nulls
+        if not undecided.any():
+            vm.release(right_node)
+            return left
+        right = vm.run_selected(right_node, inputs, Selection(left.index, undecided))
+        if right.values.dtype != bool or not right.index.equals(left.index):
+            # The selected run only computed some of the rows, so the right
+            # side is run again for all of them, which is another use of it
+            vm.add_uses([right_node])
+            return kernel(vm, left, vm.run(right_node, inputs))
+        values = left.values.copy()
+        values[undecided] = right.values[undecided]
+        if right.nulls is not None:
+            values[undecided & right.nulls] = False
+        return Column(left.index, values, left.nulls)
+
+def null_columns(node: t.Union[Node, Input]) -> t.Optional[t.FrozenSet[str]]:
+    """
+    The columns whose nulls decide where `node` is null,
+    or None if its operations could introduce other nulls
+    """
+    if not isinstance(node, Node) or not node.op.preserves_nulls:
+        return None
+    if node.op == OP.COL:
+        return frozenset(node.args)
+    columns: t.FrozenSet[str] = frozenset()
+    for child in node.inputs:
+        child_columns = null_columns(child)
+        if child_columns is None:
+            return None
+        columns |= child_columns
+    return columns
+
+@dataclass(frozen=True, eq=False)
+class Input:
+    """ A value passed into the program, like the column a cast is applied to """
+    position: int
+    key: None = None
+
+    def eval(self, vm: VM, inputs: t.Sequence[Column]) -> Column:
+        return inputs[self.position]
+
+class Program:
+    """
+    An expression compiled once into a tree of kernel calls,
+    so it can be evaluated against any number of tables.
+    """
+    root: t.Union[Node, Input]
+    num_inputs: int
+
+    def __init__(self, root: t.Union[Node, Input], num_inputs: int):
+        self.root = root
+        self.num_inputs = num_inputs
+
+    @staticmethod
+    def compile(expr: Expr) -> Program:
+        stack: t.List[t.Union[Node, Input]] = []
+        num_inputs = 0
+        for cmd in expr:
+            if len(stack) < cmd.num_stack_args:
+                # Only the first command may read from the program's inputs
+                assert len(stack) == 0 and num_inputs == 0, 'Expression is missing stack arguments'
+                num_inputs = cmd.num_stack_args
+                stack = [Input(i) for i in range(num_inputs)]
+            split = len(stack) - cmd.num_stack_args
+            inputs = tuple(stack[split:])
+            key = None
+            if all(node.key is not None for node in inputs):
+                key = (cmd.op, tuple(node.key for node in inputs), literal_key(cmd.args))
+            node_type = LogicalNode if cmd.op in (OP.AND, OP.OR) else Node
+            node = node_type(
+                op=cmd.op,
+                inputs=inputs,
+                args=tuple(cmd.args),
+                key=key,
+            )
+            del stack[split:]
+            stack.append(node)
+        assert len(stack) == 1, 'Expression should leave exactly one value on the stack'
+        return Program(stack[0], num_inputs)
+
+    def __call__(self, vm: VM, *inputs: Column) -> Column:
+        assert len(inputs) == self.num_inputs
+        return vm.run(self.root, inputs)
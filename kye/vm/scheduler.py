@@ -0,0 +1,79 @@
+"""
+Runs the independent units of a load, like the checks of each column,
+on a pool of threads. NumPy, pandas and Arrow kernels release the GIL
+for most of their work, so the units can run at the same time. The
+pieces of a file are instead scanned on a pool of processes, which is
+kept for every load until it is closed.
+
+Results always come back in the order the units were given, so the
+masks and errors merged from them don't depend on which thread ran
+first.
+"""
+from __future__ import annotations
+import typing as t
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+T = t.TypeVar('T')
+R = t.TypeVar('R')
+
+class Scheduler:
+    workers: int
+    executor: t.Optional[ThreadPoolExecutor]
+
+    def __init__(self, workers: t.Optional[int] = 1):
+        """ Use `workers` threads, or one per CPU if None """
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        assert self.workers >= 1, "Need at least one worker"
+        self.executor = None
+
+    def map(self, fn: t.Callable[[T], R], items: t.Iterable[T]) -> t.List[R]:
+        """
+        Run `fn` on each item, and return the results in the same order.
+        If any of them raise, the error of the first one is raised.
+        """
+        items = list(items)
+        if self.workers == 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='kye')
+        return list(self.executor.map(fn, items))
+
+    def close(self):
+        """ Stop the threads, which are started again if the scheduler is used after """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+SERIAL = Scheduler(1)
+
+class ProcessPool:
+    processes: int
+    executor: t.Optional[ProcessPoolExecutor]
+
+    def __init__(self, processes: t.Optional[int] = 1):
+        """ Use `processes` processes, or one per CPU if None """
+        self.executor = None
+        self.resize(processes)
+
+    def resize(self, processes: t.Optional[int]):
+        """ Change the number of processes, stopping the ones already started if it changed """
+        processes = processes if processes is not None else os.cpu_count() or 1
+        assert processes >= 1, "Need at least one process"
+        if self.executor is not None and processes != self.processes:
+            self.close()
+        self.processes = processes
+
+    def map(self, fn: t.Callable[[T], R], items: t.Iterable[T]) -> t.Iterator[R]:
+        """ Run `fn` on each item in the processes, and yield the results in the same order """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.processes)
+        return self.executor.map(fn, items)
+
+    def close(self):
+        """ Stop the processes, which are started again if the pool is used after """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+SINGLE_PROCESS = ProcessPool(1)
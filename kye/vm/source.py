@@ -0,0 +1,289 @@
+"""
+Where the rows of a table are read from. A source is read in chunks of
+rows, and can be read again from the start, so the loader can validate a
+file without holding all of it in memory at once.
+
+A source can be split into pieces that each read a separate range of
+its rows, so that several processes can check it without each reading
+all of it.
+
+Columnar files are read by the sources in `kye.vm.columnar`.
+"""
+from __future__ import annotations
+import typing as t
+import io
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import numpy as np
+
+from kye.vm.statistics import ColumnStatistics
+
+# Chunk size used when reading from stdin, which is never read whole
+DEFAULT_CHUNKSIZE = 100_000
+# Bytes read at a time when looking for where the lines of a file start
+BLOCK_SIZE = 2**20
+
+TEXT_FORMATS = ('csv', 'json', 'jsonl')
+# Columnar formats, which are read with pyarrow
+COLUMNAR_FORMATS = ('parquet', 'feather', 'arrow')
+FORMATS = TEXT_FORMATS + COLUMNAR_FORMATS
+
+class Source:
+    """
+    The rows of a table, read one chunk at a time. Each chunk has a
+    RangeIndex that continues from the previous chunk, so row numbers
+    are the same no matter how the source is split.
+    """
+    # Whether every chunk has the same columns
+    uniform_columns: bool = True
+    # Whether the rows are numbered from zero rather than as in the source
+    # this was split from, since the rows before them were not counted
+    renumbered: bool = False
+
+    def chunks(self, dtype: t.Optional[t.Dict[str, t.Any]] = None, chunksize: t.Optional[int] = None, usecols: t.Optional[t.Callable[[str], bool]] = None) -> t.Iterator[pd.DataFrame]:
+        """
+        Read the source from the start, in chunks of `chunksize` rows if
+        given. Sources that can skip columns without parsing them only
+        read the columns that `usecols` accepts, and others read them all.
+        """
+        raise NotImplementedError()
+
+    def split(self, count: int) -> t.List[Source]:
+        """
+        Split the source into up to `count` pieces that read separate
+        ranges of its rows, in order, and that other processes can read
+        """
+        return [self]
+
+    def statistics(self, col_name: str, start: int, stop: int) -> t.Optional[ColumnStatistics]:
+        """
+        The smallest and largest value of a column in the rows from
+        `start` to `stop`, if the source knows them without reading the rows
+        """
+        return None
+
+class FrameSource(Source):
+    df: pd.DataFrame
+    chunksize: t.Optional[int]
+
+    def __init__(self, df: pd.DataFrame, chunksize: t.Optional[int] = None):
+        if not isinstance(df.index, pd.RangeIndex):
+            assert None not in df.index.names, "Table should have a range index or a named index"
+            df.reset_index(inplace=True)
+        assert df.index.is_unique, "Table index must be unique at this point"
+        self.df = df
+        self.chunksize = chunksize
+
+    def chunks(self, dtype: t.Optional[t.Dict[str, t.Any]] = None, chunksize: t.Optional[int] = None, usecols: t.Optional[t.Callable[[str], bool]] = None) -> t.Iterator[pd.DataFrame]:
+        chunksize = chunksize or self.chunksize
+        if chunksize is None or len(self.df) <= chunksize:
+            yield self.df
+            return
+        for start in range(0, len(self.df), chunksize):
+            yield self.df.iloc[start:start + chunksize]
+
+    def split(self, count: int) -> t.List[Source]:
+        # Other processes are each sent a copy of only their own rows
+        starts = np.linspace(0, len(self.df), min(count, len(self.df)) + 1).astype(int)
+        if len(starts) <= 2:
+            return [self]
+        return [
+            FrameSource(self.df.iloc[start:stop], self.chunksize)
+            for start, stop in zip(starts[:-1], starts[1:])
+        ]
+
+class FileSource(Source):
+    file: t.Union[Path, Spool]
+    format: str
+    chunksize: t.Optional[int]
+    # The bytes of the file that a piece reads, and the header line of
+    # a CSV file, which a piece after the first reads before them
+    byte_range: t.Optional[t.Tuple[int, int]]
+    header: bytes
+
+    def __init__(self, file: t.Union[Path, Spool], format: str, chunksize: t.Optional[int] = None, byte_range: t.Optional[t.Tuple[int, int]] = None, header: bytes = b''):
+        if format not in TEXT_FORMATS:
+            raise ValueError(f"Unknown file type {format}")
+        self.file = file
+        self.format = format
+        self.chunksize = chunksize
+        self.byte_range = byte_range
+        self.header = header
+        # Each line of a JSON Lines file can have different keys
+        self.uniform_columns = format != 'jsonl'
+        self.renumbered = byte_range is not None and byte_range[0] > 0
+
+    def open(self) -> t.Union[Path, t.BinaryIO]:
+        if isinstance(self.file, Spool):
+            return self.file.reopen()
+        if self.byte_range is not None:
+            return io.BufferedReader(FileRange(self.file, *self.byte_range, self.header))
+        return self.file
+
+    def split(self, count: int) -> t.List[Source]:
+        # Only a file on disk can be opened again by another process, and
+        # a JSON array can only be parsed as a whole
+        if count < 2 or not isinstance(self.file, Path) or self.format == 'json':
+            return [self]
+        size = self.file.stat().st_size
+        targets = [size * i // count for i in range(1, count)]
+        if self.format == 'csv':
+            # Each piece reads the header line, and a line only ends at a
+            # newline outside of quotes
+            header_end, *starts = find_line_starts(self.file, [0] + targets, b'"')
+            with open(self.file, 'rb') as file:
+                header = file.read(header_end)
+        else:
+            header = b''
+            starts = find_line_starts(self.file, targets)
+        starts = [0] + [start for start in starts if start < size] + [size]
+        if len(starts) <= 2:
+            return [self]
+        return [
+            FileSource(self.file, self.format, self.chunksize, (start, stop), header if i > 0 else b'')
+            for i, (start, stop) in enumerate(zip(starts[:-1], starts[1:]))
+        ]
+
+    def chunks(self, dtype: t.Optional[t.Dict[str, t.Any]] = None, chunksize: t.Optional[int] = None, usecols: t.Optional[t.Callable[[str], bool]] = None) -> t.Iterator[pd.DataFrame]:
+        chunksize = chunksize or self.chunksize
+        file = self.open()
+        try:
+            if self.format == 'csv':
+                if chunksize is None:
+                    yield pd.read_csv(file, dtype=dtype, usecols=usecols)
+                    return
+                with pd.read_csv(file, dtype=dtype, usecols=usecols, chunksize=chunksize) as reader:
+                    yield from reader
+            elif self.format == 'jsonl':
+                if chunksize is None:
+                    yield pd.read_json(file, lines=True)
+                    return
+                with pd.read_json(file, lines=True, chunksize=chunksize) as reader:
+                    yield from reader
+            else:
+                # A JSON array can only be parsed as a whole
+                yield pd.read_json(file)
+        finally:
+            if self.byte_range is not None:
+                t.cast(t.BinaryIO, file).close()
+
+class FileRange(io.RawIOBase):
+    """ Reads the bytes of a file from `start` to `stop`, after a header of other bytes """
+    file: t.BinaryIO
+    remaining: int
+    header: bytes
+
+    def __init__(self, path: Path, start: int, stop: int, header: bytes = b''):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = stop - start
+        self.header = header
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if len(self.header):
+            data, self.header = self.header[:len(buffer)], self.header[len(buffer):]
+        else:
+            data = self.file.read(min(len(buffer), self.remaining))
+            self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+def find_line_starts(path: Path, targets: t.Sequence[int], quote: t.Optional[bytes] = None) -> t.List[int]:
+    """
+    Where the first line at or after each of the byte offsets starts, or
+    the end of the file. Given a quote character, a line only ends at a
+    newline with an even number of quotes before it, so that newlines in
+    quoted values are skipped over.
+    """
+    starts = []
+    pending = list(targets)
+    with open(path, 'rb') as file:
+        # Position of the block in the file, and the number of quotes before it
+        offset = 0
+        num_quotes = 0
+        while len(pending):
+            block = file.read(BLOCK_SIZE)
+            if len(block) == 0:
+                break
+            search_from = 0
+            while len(pending):
+                newline = block.find(b'\n', max(pending[0] - offset, search_from))
+                if newline < 0:
+                    break
+                search_from = newline + 1
+                if quote is not None and (num_quotes + block.count(quote, 0, newline)) % 2:
+                    continue
+                starts.append(offset + newline + 1)
+                pending.pop(0)
+            if quote is not None:
+                num_quotes += block.count(quote)
+            offset += len(block)
+    return starts + [offset] * len(pending)
+
+class Spool(io.RawIOBase):
+    """
+    Reads a stream once, while keeping a copy of what was read in a
+    temporary file, so that it can be read again from the start.
+    """
+    stream: t.BinaryIO
+    copy: t.BinaryIO
+    was_read: bool
+
+    def __init__(self, stream: t.BinaryIO):
+        self.stream = stream
+        self.copy = t.cast(t.BinaryIO, tempfile.TemporaryFile())
+        self.was_read = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        self.copy.write(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reopen(self) -> t.BinaryIO:
+        """ Read the whole stream again from the start """
+        if not self.was_read:
+            self.was_read = True
+            return io.BufferedReader(self)
+        # Copy whatever the first read did not get to
+        self.copy.seek(0, io.SEEK_END)
+        shutil.copyfileobj(self.stream, self.copy)
+        self.copy.seek(0)
+        return self.copy
+
+def open_source(filepath: str, format: t.Optional[str] = None, chunksize: t.Optional[int] = None) -> Source:
+    """ Open a file to load, or stdin if the path is '-' """
+    if filepath == '-':
+        if format is None:
+            raise ValueError("The format must be given when reading from stdin")
+        if format in COLUMNAR_FORMATS:
+            raise ValueError(f"Can't read {format} from stdin, it needs a file")
+        return FileSource(Spool(sys.stdin.buffer), format, chunksize or DEFAULT_CHUNKSIZE)
+    file = Path(filepath)
+    if format is None:
+        format = file.suffix.lstrip('.')
+    if format not in FORMATS:
+        raise ValueError(f"Unknown file type {file.suffix}")
+    if format in COLUMNAR_FORMATS:
+        try:
+            from kye.vm.columnar import ParquetSource, ArrowFileSource
+        except ImportError as e:
+            raise ImportError(f"Reading {format} files requires pyarrow to be installed") from e
+        if format == 'parquet':
+            return ParquetSource(file, chunksize)
+        return ArrowFileSource(file, chunksize)
+    return FileSource(file, format, chunksize)
@@ -0,0 +1,235 @@
+"""
+Keep index values on disk when they would not fit in the memory budget.
+
+The sub-index uniqueness and index conflict checks count how many groups
+share each index value. Done in memory, every value is factorized at
+once. Over the budget, the rows are split by the hash of their values
+into partitions that are written to temporary files as they are added,
+so the values are never all in memory at once. Equal values always land
+in the same partition, so each partition can be read back and counted
+on its own.
+
+The grouper keeps the index values of its groups the same way, so that
+they can be merged and checked one partition at a time. When errors are
+written to sinks, the loader keeps the failed rows of each assertion in
+a partition of its own until the whole source has been read.
+"""
+from __future__ import annotations
+import typing as t
+import math
+import os
+import pickle
+import tempfile
+import weakref
+
+import pandas as pd
+import numpy as np
+
+from kye.vm.keys import encode_keys, count_distinct, hash_rows
+
+# Rough memory used by factorizing a value of an index column, counting
+# its codes, hash table entry and unique value
+BYTES_PER_VALUE = 64
+MAX_PARTITIONS = 256
+# Partitions that a key store spills to. How many more keys will be added
+# isn't known when it starts to spill, so this allows for keys many times
+# over the budget, while each of the smaller partitions costs little to read
+KEY_PARTITIONS = 64
+
+def remove_files(paths: t.List[t.Optional[str]]):
+    for path in paths:
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+class Partitions:
+    """
+    Frames written to temporary files, split by the hash of their values.
+    The files are removed when the partitions are closed or let go of.
+    A pickled copy takes the files over, so that a worker process can
+    send back what it spilled without reading it into memory.
+    """
+    # The file of each partition, or None until something is written to it
+    paths: t.List[t.Optional[str]]
+    finalizer: weakref.finalize
+
+    def __init__(self, num_partitions: int):
+        self.paths = [None] * num_partitions
+        self.finalizer = weakref.finalize(self, remove_files, self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __enter__(self) -> Partitions:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        self.finalizer.detach()
+        return {'paths': self.paths}
+
+    def __setstate__(self, state):
+        self.paths = state['paths']
+        self.finalizer = weakref.finalize(self, remove_files, self.paths)
+
+    def close(self):
+        self.finalizer()
+
+    def write(self, df: pd.DataFrame, hashes: np.ndarray):
+        partition_ids = hashes % len(self.paths)
+        for partition_id in np.unique(partition_ids):
+            self.append(int(partition_id), df[partition_ids == partition_id])
+
+    def append(self, partition_id: int, df: pd.DataFrame):
+        path = self.paths[partition_id]
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.spill')
+            os.close(fd)
+            self.paths[partition_id] = path
+        with open(path, 'ab') as file:
+            pickle.dump(df, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def replace(self, partition_id: int, df: pd.DataFrame):
+        """ Write `df` in place of what the partition had """
+        path = self.paths[partition_id]
+        if path is not None:
+            open(path, 'wb').close()
+        if len(df):
+            self.append(partition_id, df)
+
+    def frames(self, partition_id: int) -> t.Iterator[pd.DataFrame]:
+        """ Read back each frame written to the partition, one at a time """
+        path = self.paths[partition_id]
+        if path is None:
+            return
+        with open(path, 'rb') as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    break
+
+    def read(self, partition_id: int) -> t.Optional[pd.DataFrame]:
+        parts = list(self.frames(partition_id))
+        if len(parts) == 0:
+            return None
+        return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+class KeyStore:
+    """
+    Rows whose first `num_columns` columns are index values. They are kept
+    in memory until they pass the memory budget, and are then written to
+    partitions on disk. Rows with equal index values are always in the
+    same part, so each part can be grouped on its own.
+    """
+    num_columns: int
+    memory_budget: t.Optional[int]
+    frames: t.List[pd.DataFrame]
+    num_rows: int
+    partitions: t.Optional[Partitions]
+
+    def __init__(self, num_columns: int, memory_budget: t.Optional[int] = None):
+        self.num_columns = num_columns
+        self.memory_budget = memory_budget
+        self.frames = []
+        self.num_rows = 0
+        self.partitions = None
+
+    def append(self, df: pd.DataFrame):
+        if self.partitions is not None:
+            self.partitions.write(df, hash_rows(df.iloc[:, :self.num_columns]))
+            return
+        self.frames.append(df)
+        self.num_rows += len(df)
+        size = self.num_rows * self.num_columns * BYTES_PER_VALUE
+        if self.memory_budget is not None and size > self.memory_budget:
+            self.partitions = Partitions(KEY_PARTITIONS)
+            frames, self.frames = self.frames, []
+            for frame in frames:
+                self.append(frame)
+
+    def parts(self) -> t.Iterator[t.Tuple[int, pd.DataFrame]]:
+        """ Read back each part, with the number to replace it by """
+        if self.partitions is None:
+            if len(self.frames):
+                yield 0, pd.concat(self.frames, ignore_index=True) if len(self.frames) > 1 else self.frames[0]
+            return
+        for partition_id in range(len(self.partitions)):
+            df = self.partitions.read(partition_id)
+            if df is not None:
+                yield partition_id, df
+
+    def replace(self, part_id: int, df: pd.DataFrame):
+        """ Replace one of the parts with rows that have the same index values """
+        if self.partitions is None:
+            self.frames = [df]
+            self.num_rows = len(df)
+        else:
+            self.partitions.replace(part_id, df)
+
+    def close(self):
+        self.frames = []
+        self.num_rows = 0
+        if self.partitions is not None:
+            self.partitions.close()
+
+class GroupCounter:
+    """
+    For each row, count the distinct groups that rows with the same values
+    are in. The rows are added a batch at a time, and over the memory
+    budget each batch is written to the partitions as soon as it is added.
+    Groups are numbered 0..n-1, and groups below 0 are not counted.
+    Rows with a null value get -1.
+    """
+    counts: np.ndarray
+    # Batches of values, groups and rows, when counting in memory
+    batches: t.List[t.Tuple[pd.DataFrame, np.ndarray, np.ndarray]]
+    partitions: t.Optional[Partitions]
+
+    def __init__(self, num_rows: int, num_columns: int, memory_budget: t.Optional[int] = None):
+        self.counts = np.full(num_rows, -1, dtype=np.int64)
+        self.batches = []
+        self.partitions = None
+        size = num_rows * max(num_columns, 1) * BYTES_PER_VALUE
+        if memory_budget is not None and size > memory_budget:
+            self.partitions = Partitions(min(max(math.ceil(size / max(memory_budget, 1)), 2), MAX_PARTITIONS))
+
+    def add(self, values: pd.DataFrame, groups: np.ndarray, rows: np.ndarray):
+        """ Add the values and groups of some of the rows, given by their position in the counts """
+        # Columns are numbered so that the columns of batches from
+        # different indexes line up, and can't clash with the group and row columns
+        values = values.set_axis(range(len(values.columns)), axis=1)
+        if self.partitions is None:
+            self.batches.append((values, groups, rows))
+            return
+        is_valid = values.notna().all(axis=1).to_numpy()
+        values = values[is_valid]
+        self.partitions.write(values.assign(group=groups[is_valid], row=rows[is_valid]), hash_rows(values))
+
+    def finish(self) -> np.ndarray:
+        if self.partitions is None:
+            if len(self.batches):
+                values = pd.concat([values for values, _, _ in self.batches], ignore_index=True) if len(self.batches) > 1 else self.batches[0][0]
+                groups = np.concatenate([groups for _, groups, _ in self.batches])
+                rows = np.concatenate([rows for _, _, rows in self.batches])
+                self.counts[rows] = count_groups_in_memory(values, groups)
+            return self.counts
+        with self.partitions:
+            for partition_id in range(len(self.partitions)):
+                partition = self.partitions.read(partition_id)
+                if partition is None:
+                    continue
+                self.counts[partition['row'].to_numpy()] = count_groups_in_memory(
+                    partition.drop(columns=['group', 'row']),
+                    partition['group'].to_numpy(),
+                )
+        return self.counts
+
+def count_groups_in_memory(values: pd.DataFrame, groups: np.ndarray) -> np.ndarray:
+    keys = encode_keys(values)
+    counts = count_distinct(keys, groups)
+    found = keys >= 0
+    result = np.full(len(keys), -1, dtype=np.int64)
+    result[found] = counts[keys[found]]
+    return result
@@ -0,0 +1,137 @@
+"""
+Prove that a single-column assertion passes for every row of a chunk,
+from the smallest and largest value of its column. Columnar files keep
+these statistics for each row group, so the loader can skip running an
+assertion on a chunk that is known to pass it.
+
+A row with a null value never fails an assertion, since every operation
+on it is null too. So only the non-null values, which all lie between
+the minimum and maximum, need to pass.
+"""
+from __future__ import annotations
+import typing as t
+
+from kye.vm.op import OP
+from kye.compiled import Expr
+
+class ColumnStatistics(t.NamedTuple):
+    """ The smallest and largest non-null value of a column """
+    min: t.Any
+    max: t.Any
+
+class Const(t.NamedTuple):
+    value: t.Any
+
+# The column's values on the stack, as opposed to a constant or a result
+COLUMN = object()
+
+# For a boolean result, True or False when it is the same for every
+# non-null value, or None when it can't be told from the statistics
+Truth = t.Optional[bool]
+
+FLIPPED = {
+    OP.EQ: OP.EQ,
+    OP.NE: OP.NE,
+    OP.LT: OP.GT,
+    OP.GT: OP.LT,
+    OP.LE: OP.GE,
+    OP.GE: OP.LE,
+}
+
+def kind(value: t.Any) -> t.Optional[str]:
+    """ Values can only be ordered against values of the same kind """
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, str):
+        return 'str'
+    return None
+
+def compare(op: OP, stats: ColumnStatistics, value: t.Any) -> Truth:
+    """ Whether `column <op> value` holds for every value between the minimum and maximum """
+    lo, hi = stats
+    if kind(value) is None or kind(value) != kind(lo) or kind(value) != kind(hi):
+        return None
+    if op == OP.LT:
+        return True if hi < value else False if lo >= value else None
+    if op == OP.LE:
+        return True if hi <= value else False if lo > value else None
+    if op == OP.GT:
+        return True if lo > value else False if hi <= value else None
+    if op == OP.GE:
+        return True if lo >= value else False if hi < value else None
+    is_outside = value < lo or value > hi
+    is_only_value = lo == value and hi == value
+    if op == OP.EQ:
+        return True if is_only_value else False if is_outside else None
+    if op == OP.NE:
+        return True if is_outside else False if is_only_value else None
+    return None
+
+def both(a: Truth, b: Truth) -> Truth:
+    if a is False or b is False:
+        return False
+    return True if a is True and b is True else None
+
+def either(a: Truth, b: Truth) -> Truth:
+    if a is True or b is True:
+        return True
+    return False if a is False and b is False else None
+
+def truth(value: t.Any, stats: ColumnStatistics) -> Truth:
+    if value is COLUMN:
+        # A boolean column is all True when its smallest value is True
+        if kind(stats.min) == 'bool' and kind(stats.max) == 'bool':
+            return True if stats.min else False if not stats.max else None
+        return None
+    if isinstance(value, bool) or value is None:
+        return value
+    return None
+
+def evaluate(op: OP, args: t.List[t.Any], stats: ColumnStatistics) -> t.Any:
+    if op == OP.COL:
+        return COLUMN
+    if op == OP.VAL:
+        return Const(args[0])
+    if op in FLIPPED:
+        a, b = args
+        if a is COLUMN and isinstance(b, Const):
+            return compare(op, stats, b.value)
+        if b is COLUMN and isinstance(a, Const):
+            return compare(FLIPPED[op], stats, a.value)
+        return None
+    if op == OP.BETWEEN:
+        col, lower, upper, inclusive = args
+        if col is not COLUMN:
+            return None
+        return both(
+            compare(OP.GE if inclusive.value in ('both', 'left') else OP.GT, stats, lower.value),
+            compare(OP.LE if inclusive.value in ('both', 'right') else OP.LT, stats, upper.value),
+        )
+    if op in (OP.IN, OP.NOT_IN):
+        col, values = args
+        if col is not COLUMN:
+            return None
+        is_in: Truth = False
+        for value in values.value:
+            is_in = either(is_in, compare(OP.EQ, stats, value))
+        return is_in if op == OP.IN or is_in is None else not is_in
+    if op == OP.NOT:
+        value = truth(args[0], stats)
+        return None if value is None else not value
+    if op == OP.AND:
+        return both(truth(args[0], stats), truth(args[1], stats))
+    if op == OP.OR:
+        return either(truth(args[0], stats), truth(args[1], stats))
+    return None
+
+def always_passes(expr: Expr, stats: ColumnStatistics) -> bool:
+    """ Whether the assertion passes for every row of a column with these statistics """
+    stack: t.List[t.Any] = []
+    for cmd in expr:
+        args = stack[len(stack) - cmd.num_stack_args:] if cmd.num_stack_args else []
+        del stack[len(stack) - len(args):]
+        args += [Const(arg) if cmd.op != OP.COL else arg for arg in cmd.args]
+        stack.append(evaluate(cmd.op, args, stats))
+    return len(stack) == 1 and truth(stack[0], stats) is True
@@ -0,0 +1,109 @@
+"""
+A model's table, which more sources can be loaded into after the first.
+
+The groups of the table are kept in the parts they were added in. A new
+source is matched against an index of each part's values for each of
+the model's indexes, so loading it only looks at its own groups and not
+the whole table. The indexes are only built once a part is searched,
+so a table loaded from a single source never builds them.
+"""
+from __future__ import annotations
+import typing as t
+
+import pandas as pd
+import numpy as np
+
+import kye.compiled as c
+from kye.vm.grouper import common_dtype
+
+class Table:
+    model: c.Model
+    parts: t.List[pd.DataFrame]
+    # Position of the first group of each part
+    offsets: t.List[int]
+    num_groups: int
+    # For each part, its values of each of the model's indexes that it was searched by
+    lookups: t.List[t.Dict[int, pd.Index]]
+    # Number after the last source row loaded so far, which the rows of the next source are numbered from
+    next_row: int
+
+    def __init__(self, model: c.Model):
+        self.model = model
+        self.parts = []
+        self.offsets = []
+        self.num_groups = 0
+        self.lookups = []
+        self.next_row = 0
+
+    @property
+    def df(self) -> t.Optional[pd.DataFrame]:
+        if len(self.parts) == 0:
+            return None
+        if len(self.parts) > 1:
+            self.parts = [pd.concat(self.parts)]
+            self.offsets = [0]
+            self.lookups = [{}]
+        return self.parts[0]
+
+    def find(self, index_id: int, df: pd.DataFrame) -> np.ndarray:
+        """
+        Find the position of the group that has each row's values for
+        one of the indexes, or -1. The columns of `df` are matched to
+        the index's columns by position.
+        """
+        values = to_index(df)
+        positions = np.full(len(df), -1, dtype=np.int64)
+        for part, offset, lookups in zip(self.parts, self.offsets, self.lookups):
+            if index_id not in lookups:
+                lookups[index_id] = to_index(part[self.model.indexes[index_id]])
+            found = lookups[index_id].get_indexer(values)
+            is_found = found >= 0
+            positions[is_found] = found[is_found] + offset
+        return positions
+
+    def locate(self, positions: np.ndarray) -> t.Iterator[t.Tuple[pd.DataFrame, np.ndarray, np.ndarray]]:
+        """ Split group positions by the part they are in, with their position in that part """
+        part_ids = np.searchsorted(self.offsets, positions, side='right') - 1
+        for part_id in np.unique(part_ids):
+            selected = np.flatnonzero(part_ids == part_id)
+            yield self.parts[part_id], selected, positions[selected] - self.offsets[part_id]
+
+    def take(self, col_name: str, positions: np.ndarray) -> np.ndarray:
+        """ The values of a column for the groups at the positions """
+        values = np.full(len(positions), np.nan, dtype=object)
+        for part, selected, part_positions in self.locate(positions):
+            if col_name in part.columns:
+                values[selected] = part[col_name].to_numpy()[part_positions]
+        return values
+
+    def merge(self, df: pd.DataFrame):
+        """
+        Merge the groups of a new source into the table. Groups that
+        the table already has take the new values, which the checks
+        have already combined with the old ones.
+        """
+        positions = self.find(0, df[self.model.indexes[0]])
+        is_new = positions < 0
+        if not is_new.all():
+            updates = df[~is_new]
+            for part, selected, part_positions in self.locate(positions[~is_new]):
+                for col_name in updates.columns:
+                    values = updates[col_name].iloc[selected]
+                    if col_name not in part.columns:
+                        part[col_name] = pd.Series(np.nan, index=part.index, dtype=object)
+                    dtype = common_dtype([part[col_name].dtype, values.dtype])
+                    if part[col_name].dtype != dtype:
+                        part[col_name] = part[col_name].astype(dtype)
+                    part.iloc[part_positions, part.columns.get_loc(col_name)] = values.to_numpy()
+        if is_new.any():
+            new = df[is_new]
+            self.parts.append(new)
+            self.offsets.append(self.num_groups)
+            self.lookups.append({})
+            self.num_groups += len(new)
+
+def to_index(df: pd.DataFrame) -> pd.Index:
+    """ An index of the rows of `df`, with its columns taken by position """
+    if len(df.columns) == 1:
+        return pd.Index(df.iloc[:, 0])
+    return pd.MultiIndex.from_frame(df.set_axis(range(len(df.columns)), axis=1))
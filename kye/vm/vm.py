@@ -4,125 +4,117 @@ import pandas as pd
 import numpy as np
 
 from kye.vm.op import OP
-from kye.compiled import Cmd
-from kye.errors.exceptions import KyeValueError
+from kye.vm.column import Column, Selection
+from kye.vm.program import Program, Node, Input
+from kye.vm.engine import Engine, PANDAS
+from kye.vm.lists import ListArray
+from kye.compiled import Expr
 
-class Stack:
-    def __init__(self):
-        self.stack = pd.DataFrame()
-        self.stack_size = 0
-    
-    def __len__(self):
-        return self.stack_size
-    
-    @property
-    def is_empty(self):
-        return self.stack_size == 0
+class VM:
+    df: pd.DataFrame
+    engine: Engine
+    # Object columns of the table that were already flattened,
+    # which can be shared with other VMs of the same table
+    lists: t.Dict[str, ListArray]
+    cache: t.Dict[t.Hashable, Column]
+    uses: t.Dict[t.Hashable, int]
+    selection: t.Optional[Selection]
+
+    def __init__(self, df: pd.DataFrame, engine: Engine = PANDAS, lists: t.Optional[t.Dict[str, ListArray]] = None):
+        self.df = df
+        self.engine = engine
+        self.lists = lists if lists is not None else {}
+        self.cache = {}
+        self.uses = {}
+        self.selection = None
+
+    def plan(self, programs: t.Iterable[Program]):
+        """
+        Count how many times each sub-expression of the programs will be
+        used, so that shared column loads and sub-expressions are computed
+        once and then evicted after their last use.
+        """
+        self.add_uses(program.root for program in programs)
 
-    def _preprocess(self, col: pd.Series) -> pd.Series:
-        if col.hasnans:
-            col = col.dropna()
-        # Duplicate index values are only allowed if they each have a different value
-        if not col.index.is_unique:
-            # Not sure which is faster
-            # col = col.groupby(col.index).unique().explode()
-            col = col.reset_index().drop_duplicates().set_index(col.index.names).iloc[:,0] # type: ignore
-        return col
-    
-    def push(self, val: pd.Series):
-        val = self._preprocess(val)
-        if self.is_empty:
-            self.stack = val.rename(self.stack_size).to_frame()
+    def add_uses(self, roots: t.Iterable[t.Union[Node, Input]]):
+        """ Count one more use of each of the nodes, and of what they are computed from """
+        seen = set()
+        stack = []
+        for root in roots:
+            if root.key is not None:
+                self.uses[root.key] = self.uses.get(root.key, 0) + 1
+                stack.append(root)
+        while len(stack):
+            node = stack.pop()
+            if node.key in seen:
+                continue
+            seen.add(node.key)
+            for child in node.inputs:
+                if child.key is not None:
+                    self.uses[child.key] = self.uses.get(child.key, 0) + 1
+                    stack.append(child)
+
+    def run(self, node: t.Union[Node, Input], inputs: t.Sequence[Column]) -> Column:
+        key = node.key
+        if key is None:
+            return node.eval(self, inputs)
+        value = self.cache.pop(key, None)
+        is_complete = True
+        if value is None:
+            value = node.eval(self, inputs)
+            # Loads are always complete, other results only cover the selection
+            is_complete = self.selection is None or node.op in (OP.COL, OP.VAL)
+        remaining = self.uses.get(key, 0) - 1
+        if remaining > 0:
+            self.uses[key] = remaining
+            if is_complete:
+                # Cached results are read again, so they can't be overwritten
+                value.temporary = False
+                self.cache[key] = value
         else:
-            self.stack = pd.merge(self.stack, val.rename(self.stack_size), left_index=True, right_index=True, how='outer')
-        self.stack_size += 1
-    
-    def pop(self) -> pd.Series:
-        assert not self.is_empty
-        self.stack_size -= 1
-        col = self.stack.loc[:,self.stack_size]
-        self.stack.drop(columns=[self.stack_size], inplace=True)
-        return self._preprocess(col)
+            self.uses.pop(key, None)
+        return value
 
+    def run_selected(self, node: t.Union[Node, Input], inputs: t.Sequence[Column], selection: Selection) -> Column:
+        """ Run a node, only computing the selected rows """
+        previous = self.selection
+        self.selection = selection
+        try:
+            return self.run(node, inputs)
+        finally:
+            self.selection = previous
 
-def groupby_index(col):
-    return col.groupby(col.index)
+    def release(self, node: t.Union[Node, Input]):
+        """ Give up a planned use of a node that will not be run after all """
+        key = node.key
+        if key is None or key not in self.uses:
+            return
+        remaining = self.uses[key] - 1
+        if remaining > 0:
+            self.uses[key] = remaining
+            return
+        del self.uses[key]
+        # If it was never computed, its own inputs will not be used either
+        if self.cache.pop(key, None) is None:
+            for child in node.inputs:
+                self.release(child)
 
-class VM:
-    df: pd.DataFrame
-    
-    def __init__(self, df: pd.DataFrame):
-        self.df = df
-        
-    def get_column(self, col_name):
-        if col_name in self.df:
-            return self.df[col_name].explode().dropna().infer_objects()
-        raise ValueError(f'Column not found: {col_name}')
+    def get_column(self, col_name) -> Column:
+        if col_name not in self.df:
+            raise ValueError(f'Column not found: {col_name}')
+        col = self.df[col_name]
+        if col.dtype == 'object':
+            # Each value of a many-valued column gets its own row. The column
+            # keeps sharing the table's index unless it had lists of values.
+            col = self.get_lists(col_name).to_series(self.df.index)
+        return Column.from_series(col)
 
-    def run_command(self, op, args):
-        if op == OP.COL:
-            return self.get_column(args[0])
-        if op == OP.VAL:
-            return pd.Series(args[0], index=self.df.index)
-        elif op == OP.CAST:
-            try:
-                return args[0].astype(args[1])
-            except ValueError as e:
-                raise KyeValueError(f'Failed to cast column: {e}')
-        elif op == OP.NA:
-            return args[0].isnull()
-        elif op == OP.DEF:
-            return args[0].notnull()
-        elif op == OP.NOT:
-            return ~args[0]
-        elif op == OP.NEG:
-            return -args[0]
-        elif op == OP.LEN:
-            return args[0].str.len()
-        elif op == OP.NE:
-            return args[0] != args[1]
-        elif op == OP.EQ:
-            return args[0] == args[1]
-        elif op == OP.OR:
-            return args[0] | args[1]
-        elif op == OP.AND:
-            return args[0] & args[1]
-        elif op == OP.LT:
-            return args[0] < args[1]
-        elif op == OP.GT:
-            return args[0] > args[1]
-        elif op == OP.LE:
-            return args[0] <= args[1]
-        elif op == OP.GE:
-            return args[0] >= args[1]
-        elif op == OP.ADD:
-            return args[0] + args[1]
-        elif op == OP.SUB:
-            return args[0] - args[1]
-        elif op == OP.MUL:
-            return args[0] * args[1]
-        elif op == OP.DIV:
-            return args[0] / args[1]
-        elif op == OP.MOD:
-            return args[0] % args[1]
-        elif op == OP.CONCAT:
-            return args[0] + args[1]
-        elif op == OP.MATCHES:
-            return args[0].str.contains(args[1], regex=True)
-        elif op == OP.COUNT:
-            return groupby_index(args[0]).nunique()
-        else:
-            raise ValueError(f'Invalid operation: {op}')
+    def get_lists(self, col_name: str) -> ListArray:
+        if col_name not in self.lists:
+            self.lists[col_name] = ListArray.from_series(self.df[col_name])
+        return self.lists[col_name]
 
-    def eval(self, commands: t.List[Cmd]):
-        stack = Stack()
-        
-        for cmd in commands:
-            args = cmd.args[:]
-            assert len(stack) >= cmd.num_stack_args
-            for _ in range(cmd.num_stack_args):
-                args.insert(0, stack.pop())
-            result = self.run_command(cmd.op, args)
-            stack.push(result)
-        
-        return stack.pop()
+    def eval(self, program: t.Union[Program, Expr], *inputs: Column) -> pd.Series:
+        if not isinstance(program, Program):
+            program = Program.compile(program)
+        return program(self, *inputs).to_series()
@@ -1,5 +1,10 @@
 import typing as t
 import sys
+import io
+import contextlib
+import itertools
+import json
+import tempfile
 from pathlib import Path
 from argparse import ArgumentParser
 
@@ -9,15 +14,26 @@ import pandas as pd
 
 parser = ArgumentParser(description="Kye Test Runner")
 parser.add_argument("--debug", action='store_true', help="Only run debug tests")
+parser.add_argument("--engine", default='pandas', help="Engine used to evaluate expressions")
+parser.add_argument("--chunksize", type=int, help="Load the data this many rows at a time")
+parser.add_argument("--memory-budget", type=float, help="Megabytes the index checks can use before spilling to disk")
+parser.add_argument("--workers", type=int, default=1, help="Number of threads used to check columns")
+parser.add_argument("--processes", type=int, default=1, help="Number of processes to split the rows between")
 args = parser.parse_args()
 
 from kye.kye import Kye
 from kye.errors.validation_errors import ValidationErrorReporter
+from kye.errors.sinks import open_sink
 
 PROJECT_DIR = Path(__file__).resolve().parent / '..'
 TESTS_FILEPATH = PROJECT_DIR / 'tests/validation_tests.yaml'
 
 ONLY_RUN_DEBUG = args.debug
+ENGINE = args.engine
+CHUNKSIZE = args.chunksize
+MEMORY_BUDGET = int(args.memory_budget * 2**20) if args.memory_budget is not None else None
+WORKERS = args.workers
+PROCESSES = args.processes
 
 class Printer:    
     def __init__(self):
@@ -37,6 +53,74 @@ class Printer:
         print('   ❌ ' + test)
         
 
+# Where the files of tests that load files are written
+TMP_DIR = tempfile.TemporaryDirectory()
+FILE_NUMBERS = itertools.count()
+
+# Keys of a test's data that are options of the source rather than models
+SOURCE_OPTIONS = ('first_row', 'format', 'chunksize', 'stdin', 'row_group_size')
+
+def write_file(rows: t.List[dict], path: Path, format: str, row_group_size: t.Optional[int] = None):
+    if format in ('parquet', 'feather', 'arrow'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import pyarrow.feather as feather
+        table = pa.Table.from_pandas(pd.DataFrame(rows), preserve_index=False)
+        if format == 'parquet':
+            # Each row group is a separate chunk, with its own statistics
+            pq.write_table(table, path, row_group_size=row_group_size)
+        elif format == 'feather':
+            feather.write_feather(table, path, chunksize=row_group_size)
+        else:
+            # An uncompressed Arrow IPC file, in record batches of `row_group_size` rows
+            with pa.ipc.new_file(path, table.schema) as writer:
+                for batch in table.to_batches(row_group_size):
+                    writer.write_batch(batch)
+    elif format == 'csv':
+        pd.DataFrame(rows).to_csv(path, index=False)
+    elif format == 'jsonl':
+        # Each line only has the keys of its row
+        path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+    elif format == 'json':
+        path.write_text(json.dumps(rows))
+    else:
+        raise ValueError(f"Unknown test file format '{format}'")
+
+def load_data(kye: Kye, model_name: str, rows: t.List[dict], options: dict):
+    df = pd.DataFrame(rows)
+    if 'first_row' in options:
+        # Number the rows from somewhere other than zero, like a slice of a frame
+        df.index = pd.RangeIndex(options['first_row'], options['first_row'] + len(df))
+    if 'format' not in options:
+        kye.load_df(model_name, df, CHUNKSIZE)
+        return
+    # Write the rows to a file and load it like the command line would.
+    # The file is kept until the end of the run, since the rows shown
+    # with the errors are read from it again
+    path = Path(TMP_DIR.name) / f"{next(FILE_NUMBERS)}.{options['format']}"
+    write_file(rows, path, options['format'], options.get('row_group_size'))
+    chunksize = options.get('chunksize', CHUNKSIZE)
+    if not options.get('stdin'):
+        kye.load_file(model_name, str(path), chunksize=chunksize)
+        return
+    stdin = sys.stdin
+    sys.stdin = io.TextIOWrapper(path.open('rb'))
+    try:
+        kye.load_file(model_name, '-', options['format'], chunksize)
+    finally:
+        # The source keeps reading the file when it shows rows with the
+        # errors, so it must not be closed along with the wrapper
+        sys.stdin.detach()
+        sys.stdin = stdin
+
+def read_errors(path: Path) -> pd.DataFrame:
+    """ Read the errors that a sink wrote to a file """
+    if path.suffix == '.jsonl':
+        return pd.read_json(path, lines=True, dtype=False)
+    if path.suffix == '.csv':
+        return pd.read_csv(path)
+    return pd.read_parquet(path)
+
 def lookup(df, query: dict):
     mask = pd.Series(True, index=df.index)
     for prop, values in query.items():
@@ -55,6 +139,7 @@ if __name__ == "__main__":
 
     for test_case in test_cases:
         compiled = None
+        kye = None
         
         for test in test_case['tests']:
             if ONLY_RUN_DEBUG and not test.get('debug'):
@@ -63,7 +148,7 @@ if __name__ == "__main__":
                 print('WARNING: debug test found in non-debug mode')
             
             if compiled is None:
-                kye = Kye()
+                kye = Kye(engine=ENGINE, memory_budget=MEMORY_BUDGET, workers=WORKERS, processes=PROCESSES)
                 successful_compilation = kye.compile(test_case['schema'])
                 
                 # Check for successful compilation
@@ -75,13 +160,35 @@ if __name__ == "__main__":
                 compiled = kye.compiled
                 assert compiled is not None
             
+            # A test can split its rows between processes, whatever the rest use
+            kye.processes = test.get('processes', PROCESSES)
+            # A test can write its errors to a file, which is checked
+            # instead of the errors the reporter kept
+            errors_path = None
+            kye.error_sinks = []
+            if 'errors_out' in test:
+                errors_path = Path(TMP_DIR.name) / f"{next(FILE_NUMBERS)}.{test['errors_out']}"
+                kye.error_sinks = [open_sink(str(errors_path))]
             kye.load_compiled(compiled)
             
-            # Load the data
-            for model_name, rows in test['data'].items():
-                kye.load_df(model_name, pd.DataFrame(rows))
+            # Load the data, which can be a list of sources loaded one after the other
+            sources = test['data'] if isinstance(test['data'], list) else [test['data']]
+            for data in sources:
+                options = {key: value for key, value in data.items() if key in SOURCE_OPTIONS}
+                for model_name, rows in data.items():
+                    if model_name not in SOURCE_OPTIONS:
+                        load_data(kye, model_name, rows, options)
             
-            error_df = t.cast(ValidationErrorReporter, kye.reporter).error_df.copy()
+            if errors_path is None:
+                error_df = t.cast(ValidationErrorReporter, kye.reporter).error_df.copy()
+            else:
+                for sink in kye.error_sinks:
+                    sink.close()
+                error_df = read_errors(errors_path)
+                if error_df.duplicated().any():
+                    printer.failure(test_case['feature'], test['test'])
+                    print(error_df[error_df.duplicated(keep=False)])
+                    raise Exception('Errors written more than once')
             error_df['unused'] = True
             expected_errors = test.get('errors', [])
             
@@ -110,11 +217,25 @@ if __name__ == "__main__":
                 print(error_df[error_df['unused']].drop(columns=['unused']))
                 raise Exception('Unused errors')
 
+            # Check which source rows are shown with the errors
+            if 'shown_rows' in test:
+                reporter = t.cast(ValidationErrorReporter, kye.reporter)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    reporter.report()
+                shown_rows = reporter.highlighted_rows()
+                if shown_rows != test['shown_rows']:
+                    printer.failure(test_case['feature'], test['test'])
+                    kye.reporter.report()
+                    print(f"Expected rows {test['shown_rows']} to be shown, but got {shown_rows}")
+                    raise Exception('Wrong rows shown')
+
             # Success!
             printer.success(test_case['feature'], test['test'])
 
             # If debugging then print the errors
             if ONLY_RUN_DEBUG:
                 kye.reporter.report()
+        if kye is not None:
+            kye.close()
     if printer.feature is None:
         print('No tests found')
\ No newline at end of file